@@ -0,0 +1,106 @@
+"""Book lookups over a list scan (the old books.py) vs. BookCatalog's indexes.
+
+Builds `--books` books with `--authors` authors and `--categories` categories,
+then times the lookups the routes do, as the median of `--repeat` runs:
+finding a book by title (the last one, the scan's worst case), filtering by
+author and category, and listing a whole category. Replacing and removing a
+book through the catalog, and building its indexes, are timed too.
+
+Run from books/: python benchmarks/bench_catalog.py [--books 1000000]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from catalog import BookCatalog
+
+
+def make_books(count: int, authors: int, categories: int) -> list:
+    rng = random.Random(42)
+    return [{"title": f"Title {i}", "author": f"Author {rng.randrange(authors)}",
+             "category": f"Category {rng.randrange(categories)}"} for i in range(count)]
+
+
+# The lookups as books.py did them before the catalog.
+def scan_title(books, title):
+    for book in books:
+        if book.get("title").casefold() == title.casefold():
+            return book
+
+
+def scan_author_category(books, author, category):
+    return [book for book in books
+            if book.get("author").casefold() == author.casefold()
+            and book.get("category").casefold() == category.casefold()]
+
+
+def scan_category(books, category):
+    return [book for book in books if book.get("category").casefold() == category.casefold()]
+
+
+def median_seconds(function, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def format_time(seconds: float) -> str:
+    if seconds >= 1e-3:
+        return f"{seconds * 1e3:.1f} ms"
+    return f"{seconds * 1e6:.1f} us"
+
+
+def main(count: int, authors: int, categories: int, repeat: int):
+    books = make_books(count, authors, categories)
+    start = time.perf_counter()
+    catalog = BookCatalog(books)
+    build = time.perf_counter() - start
+    last_title = books[-1]["title"]
+    author, category = books[-1]["author"], books[-1]["category"]
+    matches = len(scan_category(books, category))
+    assert scan_title(books, last_title) is catalog.find_first("title", last_title)
+    assert scan_author_category(books, author, category) == catalog.find_all(author=author, category=category)
+    assert scan_category(books, category) == catalog.find_all(category=category)
+
+    print(f"{count} books, {authors} authors, {categories} categories; indexes built in {build:.1f} s")
+    print(f"{'':<34}{'scan':>12}{'index':>12}")
+    rows = [
+        ("title (last book)", lambda: scan_title(books, last_title),
+         lambda: catalog.find_first("title", last_title)),
+        ("author + category", lambda: scan_author_category(books, author, category),
+         lambda: catalog.find_all(author=author, category=category)),
+        (f"category ({matches} results)", lambda: scan_category(books, category),
+         lambda: catalog.find_all(category=category)),
+    ]
+    for label, scan, indexed in rows:
+        print(f"{label:<34}{format_time(median_seconds(scan, repeat)):>12}"
+              f"{format_time(median_seconds(indexed, repeat * 100)):>12}")
+
+    book_ids = random.Random(7).sample(range(count), 1000)
+    start = time.perf_counter()
+    for book_id in book_ids:
+        catalog.replace(book_id, {**books[book_id], "author": "Someone Else"})
+    replace = (time.perf_counter() - start) / len(book_ids)
+    start = time.perf_counter()
+    for book_id in book_ids:
+        catalog.remove(book_id)
+    remove = (time.perf_counter() - start) / len(book_ids)
+    print(f"replace {format_time(replace)}, remove {format_time(remove)} per book")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--books", type=int, default=1_000_000)
+    parser.add_argument("--authors", type=int, default=50_000)
+    parser.add_argument("--categories", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=5)
+    arguments = parser.parse_args()
+    main(arguments.books, arguments.authors, arguments.categories, arguments.repeat)
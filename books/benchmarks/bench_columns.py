@@ -0,0 +1,125 @@
+"""Multi-field book queries: scanning dicts vs. the hash indexes vs. NumPy masks.
+
+For each catalog size in `--rows` this builds that many books (`--authors`
+authors, `--categories` categories) and times, as medians of `--repeat` runs:
+
+- author AND category
+- category IN (two categories)
+- category AND any of 2000 authors
+
+three ways: a list comprehension over the dicts, BookCatalog.query (the hash
+indexes) and BookColumns.query with the mask path forced. The hash-indexed
+catalog is skipped above `--max-index-rows`, where it and the dicts don't fit
+in memory together on a small machine.
+
+Run from books/: python benchmarks/bench_columns.py [--rows 1000000 10000000]
+"""
+import argparse
+import asyncio
+import gc
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import columns
+from catalog import BookCatalog, normalize
+from columns import BookColumns
+
+
+class BookList:
+    """Just enough of BookCatalog for BookColumns, over a plain list."""
+
+    def __init__(self, books: list):
+        self.books = books
+        self.next_id = len(books)
+
+    def __len__(self):
+        return len(self.books)
+
+    def get(self, book_id: int):
+        return self.books[book_id]
+
+    def estimate(self, field: str, keys) -> int:
+        return len(self.books)
+
+    def query(self, filters: dict) -> list:
+        return scan(self.books, filters)
+
+
+def scan(books: list, filters: dict) -> list:
+    keys = {field: {normalize(value) for value in values} for field, values in filters.items()}
+    return [book_id for book_id, book in enumerate(books)
+            if all(normalize(book.get(field)) in values for field, values in keys.items())]
+
+
+def make_books(count: int, authors: int, categories: int) -> list:
+    rng = random.Random(42)
+    # Shared strings, so 10M books still fit next to the columns.
+    author_names = [f"Author {i}" for i in range(authors)]
+    category_names = [f"Category {i}" for i in range(categories)]
+    return [{"title": f"Title {i}", "author": author_names[rng.randrange(authors)],
+             "category": category_names[rng.randrange(categories)]} for i in range(count)]
+
+
+def median_ms(function, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def queries(authors: int) -> list:
+    many_authors = [f"Author {i}" for i in range(0, authors, max(authors // 2000, 1))][:2000]
+    return [
+        ("author AND category", {"author": ["Author 7"], "category": ["Category 3"]}),
+        ("category IN (2)", {"category": ["Category 1", "Category 2"]}),
+        ("category AND 2000 authors", {"category": ["Category 5"], "author": many_authors}),
+    ]
+
+
+def run_size(count: int, authors: int, categories: int, repeat: int, max_index_rows: int):
+    books = make_books(count, authors, categories)
+    book_list = BookList(books)
+    book_columns = BookColumns()
+    asyncio.run(book_columns.build(book_list, chunk=100_000))
+    catalog = BookCatalog(books) if count <= max_index_rows else None
+    for label, filters in queries(authors):
+        expected = book_columns.query(book_list, filters)
+        timings = [median_ms(lambda: scan(books, filters), max(repeat // 2, 1))]
+        if catalog is not None:
+            assert catalog.query(filters) == expected
+            timings.append(median_ms(lambda: catalog.query(filters), repeat))
+        else:
+            timings.append(None)
+        assert scan(books, filters) == expected
+        timings.append(median_ms(lambda: book_columns.query(book_list, filters), repeat))
+        cells = "".join(f"{'-' if timing is None else f'{timing:.2f} ms':>14}" for timing in timings)
+        print(f"{count:>10}  {label:<26}{len(expected):>9}{cells}")
+    del books, book_list, book_columns, catalog
+    gc.collect()
+
+
+def main(row_counts: list, authors: int, categories: int, repeat: int, max_index_rows: int):
+    # Always take the mask path, which is what this compares.
+    columns.COLUMNAR_MIN_SELECTIVITY = 0
+    print(f"{authors} authors, {categories} categories, median of {repeat} runs")
+    print(f"{'books':>10}  {'query':<26}{'results':>9}{'scan dicts':>14}{'hash index':>14}{'numpy mask':>14}")
+    for count in row_counts:
+        run_size(count, authors, categories, repeat, max_index_rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000_000, 10_000_000])
+    parser.add_argument("--authors", type=int, default=20_000)
+    parser.add_argument("--categories", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--max-index-rows", type=int, default=2_000_000)
+    arguments = parser.parse_args()
+    main(arguments.rows, arguments.authors, arguments.categories, arguments.repeat, arguments.max_index_rows)
@@ -1,6 +1,11 @@
-from fastapi import FastAPI, Body
-
-app = FastAPI()
+import asyncio
+import os
+from contextlib import asynccontextmanager, suppress
+from fastapi import FastAPI, Body, HTTPException, Query, Request
+from bulk import InvalidItem, read_items
+from columns import BookColumns, np
+from search import SearchIndex
+from storage import BookStore
 
 BOOKS = [
     {"title":"Title One", "author":"Author One", "category":"Science" },
@@ -10,9 +15,57 @@ BOOKS = [
     {"title":"Title Five", "author":"Author Five", "category":"Geography" },
 ]
 
+# Books survive restarts: see storage.py. BOOKS only seeds an empty data directory.
+store = BookStore(os.getenv("BOOKS_DATA_DIR", "books_data"))
+catalog = store.open(seed=BOOKS)
+search_index = SearchIndex()
+store.listeners.append(search_index)
+# Vectorized filters need NumPy; without it /books/query/ uses the catalog's indexes.
+columns = BookColumns() if np is not None else None
+if columns is not None:
+    store.listeners.append(columns)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    flusher = asyncio.create_task(store.run())
+    indexer = asyncio.create_task(search_index.build(catalog))
+    loader = asyncio.create_task(columns.build(catalog)) if columns is not None else None
+    yield
+    indexer.cancel()
+    if loader is not None:
+        loader.cancel()
+    flusher.cancel()
+    with suppress(asyncio.CancelledError):
+        await flusher
+    await store.close()
+
+
+app = FastAPI(lifespan=lifespan)
+
 @app.get('/books')
 async def get_books():
-    return BOOKS
+    return catalog.all()
+
+@app.get("/books/search/fuzzy/")
+async def search_books(q: str = Query(min_length=1), limit: int = Query(default=10, gt=0, le=100)):
+    if not search_index.ready:
+        raise HTTPException(status_code=503, detail="Search index is still loading", headers={"Retry-After": "1"})
+    return [catalog.get(book_id) for book_id in search_index.search(q, limit)]
+
+@app.get("/books/query/")
+async def query_books(title: list[str] = Query(default=[]), author: list[str] = Query(default=[]),
+                      category: list[str] = Query(default=[]), limit: int = Query(default=100, gt=0, le=1000),
+                      offset: int = Query(default=0, ge=0)):
+    # A field given several times matches any of its values; different fields must all match.
+    filters = {field: values for field, values in (("title", title), ("author", author), ("category", category)) if values}
+    ids = find_ids(filters)
+    return [catalog.get(book_id) for book_id in ids[offset:offset + limit]]
+
+def find_ids(filters):
+    if columns is not None and columns.ready:
+        return columns.query(catalog, filters)
+    return catalog.query(filters)
 
 @app.get("/books/{dynamic_parameter}")
 async def read_all_books(dynamic_parameter):
@@ -22,43 +75,84 @@ async def read_all_books(dynamic_parameter):
 
 @app.get("/mybook/{book_name}")
 async def get_my_book(book_name:str):
-    for book in BOOKS:
-        if book.get('title').casefold() == book_name.casefold():
-            return {"my_favourite_book":book}
+    book = catalog.find_first('title', book_name)
+    if book is not None:
+        return {"my_favourite_book":book}
         
 @app.get("/books/search/")
 async def get_book_by_category(category :str):
-    books_in_category = []
-    for book in BOOKS:
-        if book.get('category').casefold() == category.casefold():
-            books_in_category.append(book)
-    return books_in_category
+    return catalog.find_all(category=category)
 
 @app.get('/books/by_author/{book_author}')
 async def read_author_category_by_query(book_author:str, book_category:str):
-    books = []
-    for book in BOOKS:
-        if book.get('author').casefold() == book_author and book.get('category').casefold() == book_category:
-            books.append(book)
-    return books
+    return [catalog.get(book_id) for book_id in find_ids({"author": [book_author], "category": [book_category]})]
 
 @app.post('/books/create/')
-async def create_new_book(new_book=Body()):
-    BOOKS.append(new_book)
+async def create_new_book(new_book: dict = Body()):
+    store.add(new_book)
     return new_book
 
 @app.put('/books/update')
-async def update_book(updated_book=Body()):
-    for i in range(len(BOOKS)):
-        if BOOKS[i].get('title').casefold() == updated_book.get('title').casefold():
-            BOOKS[i] = updated_book
-            return {"message":"Book updated"}
+async def update_book(updated_book: dict = Body()):
+    book_id = catalog.first_id('title', updated_book.get('title'))
+    if book_id is not None:
+        store.replace(book_id, updated_book)
+        return {"message":"Book updated"}
     return {"message":"no book found"}
 
 @app.delete("/books/delete_book/{book_title}")
 async def delete_book_by_title(book_title:str):
-    for i in range(len(BOOKS)):
-        if BOOKS[i].get('title').casefold() == book_title.casefold():
-            BOOKS.pop(i)
-            return {"message":"Book Deleted!"}
-    return {"message":"Book not found!"}
\ No newline at end of file
+    book_id = catalog.first_id('title', book_title)
+    if book_id is not None:
+        store.remove(book_id)
+        return {"message":"Book Deleted!"}
+    return {"message":"Book not found!"}
+
+async def apply_bulk(request: Request, apply_one):
+    """Apply apply_one to every item of a bulk body, one store batch at a time."""
+    outcomes = []
+    async for items in read_items(request):
+        with store.batch():
+            for item in items:
+                if isinstance(item, InvalidItem):
+                    outcomes.append({"status": "invalid", "detail": item.detail})
+                else:
+                    outcomes.append(apply_one(item))
+        await asyncio.sleep(0)
+    return outcomes
+
+def create_one(book):
+    if not isinstance(book, dict):
+        return {"status": "invalid", "detail": "Expected a book object"}
+    store.add(book)
+    return {"status": "created"}
+
+def update_one(book):
+    if not isinstance(book, dict):
+        return {"status": "invalid", "detail": "Expected a book object"}
+    book_id = catalog.first_id('title', book.get('title'))
+    if book_id is None:
+        return {"status": "not found"}
+    store.replace(book_id, book)
+    return {"status": "updated"}
+
+def delete_one(title):
+    if not isinstance(title, str):
+        return {"status": "invalid", "detail": "Expected a book title"}
+    book_id = catalog.first_id('title', title)
+    if book_id is None:
+        return {"status": "not found"}
+    store.remove(book_id)
+    return {"status": "deleted"}
+
+@app.post('/books/bulk/create/')
+async def create_books(request: Request):
+    return await apply_bulk(request, create_one)
+
+@app.put('/books/bulk/update')
+async def update_books(request: Request):
+    return await apply_bulk(request, update_one)
+
+@app.post('/books/bulk/delete/')
+async def delete_books(request: Request):
+    return await apply_bulk(request, delete_one)
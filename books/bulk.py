@@ -0,0 +1,51 @@
+import json
+
+from fastapi import HTTPException, Request
+
+# Items applied per store.batch(); between batches other requests get a turn.
+BATCH_SIZE = 1000
+
+NDJSON_TYPES = ("application/x-ndjson", "application/jsonl", "application/json-seq")
+
+
+class InvalidItem:
+    """Stands in for an NDJSON line that isn't valid JSON, so it gets its own outcome."""
+
+    def __init__(self, detail: str):
+        self.detail = detail
+
+
+async def read_items(request: Request, batch_size: int = BATCH_SIZE):
+    """Yield the items of a bulk request body in batches.
+
+    The body is either a JSON array or NDJSON (one JSON value per line). NDJSON
+    is parsed as it arrives, so a large upload is applied while it streams in
+    and is never held in memory as a whole.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    if content_type not in NDJSON_TYPES:
+        try:
+            items = await request.json()
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON")
+        if not isinstance(items, list):
+            raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON")
+        for start in range(0, len(items), batch_size):
+            yield items[start:start + batch_size]
+        return
+    buffer = b""
+    async for chunk in request.stream():
+        lines = (buffer + chunk).split(b"\n")
+        buffer = lines.pop()
+        batch = [parse_line(line) for line in lines if line.strip()]
+        for start in range(0, len(batch), batch_size):
+            yield batch[start:start + batch_size]
+    if buffer.strip():
+        yield [parse_line(buffer)]
+
+
+def parse_line(line: bytes):
+    try:
+        return json.loads(line)
+    except ValueError as error:
+        return InvalidItem(f"Invalid JSON: {error}")
@@ -0,0 +1,169 @@
+from collections import defaultdict
+
+INDEXED_FIELDS = ("title", "author", "category")
+
+
+def normalize(value):
+    """Index key for a field value: casefolded strings, anything else isn't indexed."""
+    return value.casefold() if isinstance(value, str) else None
+
+
+class BookCatalog:
+    """Books kept in insertion order with casefolded title/author/category indexes.
+
+    Every book gets an internal id, so books sharing a title are all kept,
+    and each index maps a normalized value to the ids having it. The indexes
+    are updated on every change, so lookups never scan the catalog.
+
+    A catalog can sit on top of a read-only `base` (a storage.Snapshot). Books
+    added or replaced since the snapshot live in memory and shadow the base;
+    deleted base books are remembered in `_removed`.
+    """
+
+    def __init__(self, books=(), base=None):
+        self.base = base
+        self._books = {}
+        self._removed = set()
+        self._next_id = base.next_id if base is not None else 0
+        self._count = base.count if base is not None else 0
+        # field -> normalized value -> ids, a dict used as an ordered set
+        self._indexes = {field: defaultdict(dict) for field in INDEXED_FIELDS}
+        for book in books:
+            self.add(book)
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def next_id(self) -> int:
+        return self._next_id
+
+    def get(self, book_id: int):
+        book = self._books.get(book_id)
+        if book is None and self.base is not None and book_id not in self._removed:
+            book = self.base.book(book_id)
+        return book
+
+    def all(self) -> list:
+        if self.base is None:
+            return list(self._books.values())
+        return [book for book in map(self.get, range(self._next_id)) if book is not None]
+
+    def add(self, book: dict) -> int:
+        book_id = self._next_id
+        self.put(book_id, book)
+        return book_id
+
+    def put(self, book_id: int, book: dict):
+        """Insert or replace the book with this id; nothing changes if it isn't a dict."""
+        if not isinstance(book, dict):
+            raise TypeError(f"a book must be a dict, not {type(book).__name__}")
+        old = self._books.get(book_id)
+        if old is not None:
+            self._unindex(book_id, old)
+        elif not self._in_base(book_id):
+            self._count += 1
+        self._books[book_id] = book
+        self._index(book_id, book)
+        self._next_id = max(self._next_id, book_id + 1)
+
+    replace = put
+
+    def remove(self, book_id: int):
+        book = self._books.pop(book_id, None)
+        if book is not None:
+            self._unindex(book_id, book)
+        if self._in_base(book_id):
+            book = book or self.base.book(book_id)
+            self._removed.add(book_id)
+        if book is not None:
+            self._count -= 1
+        return book
+
+    def first_id(self, field: str, value):
+        key = normalize(value)
+        for book_id in sorted(self._ids(field, key)):
+            if self.base is None or normalize(self.get(book_id).get(field)) == key:
+                return book_id
+        return None
+
+    def find_first(self, field: str, value):
+        book_id = self.first_id(field, value)
+        return None if book_id is None else self.get(book_id)
+
+    def find_all(self, **criteria) -> list:
+        """Books whose fields all match the given values, in catalog order."""
+        keys = {field: normalize(value) for field, value in criteria.items()}
+        if not keys:
+            return []
+        if self.base is not None:
+            # Only the smallest bucket is read; the books themselves are checked against the
+            # other fields, which also rules out collisions of the snapshot's 64-bit key hashes.
+            field = min(keys, key=lambda field: self._bucket_size(field, keys[field]))
+            books = [self.get(book_id) for book_id in sorted(self._ids(field, keys[field]))]
+            return [book for book in books if all(normalize(book.get(field)) == key for field, key in keys.items())]
+        buckets = sorted((self._indexes[field].get(key, {}) for field, key in keys.items()), key=len)
+        smallest, others = buckets[0], buckets[1:]
+        # Ids only move to the end of a bucket when a book changes, so sort to keep catalog order.
+        return [self._books[book_id] for book_id in sorted(smallest) if all(book_id in ids for ids in others)]
+
+    def query(self, filters: dict) -> list:
+        """Ids of the books matching every field against any of its values, in catalog order."""
+        keys = {field: {normalize(value) for value in values} - {None} for field, values in filters.items()}
+        if not keys:
+            return [book_id for book_id in range(self._next_id) if self.get(book_id) is not None]
+        # Walk the field with the fewest candidates and check the others on the books.
+        field = min(keys, key=lambda field: self.estimate(field, keys[field]))
+        ids = sorted(set().union(*(self._ids(field, key) for key in keys[field])))
+        return [book_id for book_id in ids
+                if all(normalize(self.get(book_id).get(field)) in values for field, values in keys.items())]
+
+    def estimate(self, field: str, keys) -> int:
+        """Upper bound on the books having any of these normalized values."""
+        return sum(self._bucket_size(field, key) for key in keys)
+
+    def changes(self):
+        """(books, removed ids) changed since the base snapshot, as copies."""
+        return dict(self._books), set(self._removed)
+
+    def rebase(self, base, books: dict, removed: set):
+        """Move onto a newer snapshot that already contains `books` and `removed`."""
+        self.base = base
+        for book_id, book in books.items():
+            current = self._books.get(book_id)
+            if current is book:
+                self._unindex(book_id, self._books.pop(book_id))
+            elif current is None:
+                # Deleted after the snapshot was taken, but the snapshot still has it.
+                self._removed.add(book_id)
+        self._removed -= removed
+
+    def _in_base(self, book_id: int) -> bool:
+        return self.base is not None and book_id not in self._removed and self.base.has(book_id)
+
+    def _bucket_size(self, field: str, key) -> int:
+        size = len(self._indexes[field].get(key, ()))
+        return size + self.base.count_for(field, key) if self.base is not None else size
+
+    def _ids(self, field: str, key):
+        ids = self._indexes[field].get(key, {})
+        if self.base is None:
+            return ids
+        books, removed = self._books, self._removed
+        return ids.keys() | {book_id for book_id in self.base.ids_for(field, key)
+                             if book_id not in books and book_id not in removed}
+
+    def _index(self, book_id: int, book: dict):
+        for field, index in self._indexes.items():
+            key = normalize(book.get(field))
+            if key is not None:
+                index[key][book_id] = None
+
+    def _unindex(self, book_id: int, book: dict):
+        for field, index in self._indexes.items():
+            key = normalize(book.get(field))
+            ids = index.get(key)
+            if ids is not None:
+                ids.pop(book_id, None)
+                if not ids:
+                    del index[key]
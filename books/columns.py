@@ -0,0 +1,118 @@
+import asyncio
+import os
+
+from catalog import normalize
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; without it queries go through the catalog's indexes.
+    np = None
+
+COLUMN_FIELDS = ("author", "category")
+# Below this fraction of the catalog the candidates of the most selective field are
+# checked one by one, which beats masking every row.
+COLUMNAR_MIN_SELECTIVITY = float(os.getenv("BOOKS_COLUMNAR_MIN_SELECTIVITY", 0.01))
+
+
+class BookColumns:
+    """Columnar copy of the author and category of every book, for vectorized filters.
+
+    Each field is dictionary-encoded: every distinct casefolded value gets a
+    small int code, and an int32 array indexed by book id holds the codes (-1
+    for a missing value). A filter is then one comparison over the whole array
+    per field, combined as boolean masks. Codes are never reused, so the
+    dictionaries only grow.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self._codes = {field: np.full(capacity, -1, dtype=np.int32) for field in COLUMN_FIELDS}
+        self._dictionaries = {field: {} for field in COLUMN_FIELDS}
+        self._alive = np.zeros(capacity, dtype=bool)
+        self._size = 0
+        # Ids below this are loaded; build() moves it up to infinity.
+        self._loaded_below = 0
+
+    @property
+    def ready(self) -> bool:
+        return self._loaded_below == float("inf")
+
+    async def build(self, catalog, chunk: int = 10000):
+        """Load every book in the catalog, yielding to the event loop between chunks."""
+        self._loaded_below = 0
+        while self._loaded_below < catalog.next_id:
+            end = min(self._loaded_below + chunk, catalog.next_id)
+            self._grow(end)
+            for book_id in range(self._loaded_below, end):
+                book = catalog.get(book_id)
+                if book is not None:
+                    self._set(book_id, book)
+            self._loaded_below = end
+            await asyncio.sleep(0)
+        self._loaded_below = float("inf")
+
+    def changed(self, book_id: int, old, new):
+        """Called by the store with the old and new version of a book, None when absent."""
+        if book_id >= self._loaded_below:
+            return
+        self._grow(book_id + 1)
+        if new is None:
+            self._alive[book_id] = False
+            for codes in self._codes.values():
+                codes[book_id] = -1
+        else:
+            self._set(book_id, new)
+
+    def query(self, catalog, filters: dict) -> list:
+        """Ids of the books matching every field against any of its values, in catalog order.
+
+        Fields without a column, and filters selective enough that checking
+        their candidates is cheaper than masking every row, go to the catalog.
+        """
+        keys = {field: {normalize(value) for value in values} - {None} for field, values in filters.items()}
+        other_fields = {field: filters[field] for field in keys if field not in self._codes}
+        columns = {field: keys[field] for field in keys if field in self._codes}
+        if not keys:
+            return np.flatnonzero(self._alive[:self._size]).tolist()
+        if not columns or any(catalog.estimate(field, keys[field]) < COLUMNAR_MIN_SELECTIVITY * len(catalog)
+                              for field in keys):
+            return catalog.query(filters)
+        mask = self._alive[:self._size].copy()
+        for field, values in columns.items():
+            dictionary = self._dictionaries[field]
+            codes = [dictionary[value] for value in values if value in dictionary]
+            if not codes:
+                return []
+            column = self._codes[field][:self._size]
+            mask &= column == codes[0] if len(codes) == 1 else np.isin(column, codes)
+        if other_fields:
+            ids = np.asarray(catalog.query(other_fields), dtype=np.int64)
+            return ids[mask[ids]].tolist()
+        return np.flatnonzero(mask).tolist()
+
+    def stats(self) -> dict:
+        return {
+            "ready": self.ready,
+            "rows": self._size,
+            "distinct": {field: len(dictionary) for field, dictionary in self._dictionaries.items()},
+        }
+
+    def _set(self, book_id: int, book: dict):
+        self._alive[book_id] = True
+        for field, codes in self._codes.items():
+            value = normalize(book.get(field))
+            if value is None:
+                codes[book_id] = -1
+                continue
+            dictionary = self._dictionaries[field]
+            code = dictionary.get(value)
+            if code is None:
+                code = dictionary[value] = len(dictionary)
+            codes[book_id] = code
+
+    def _grow(self, size: int):
+        if size > len(self._alive):
+            capacity = max(size, 2 * len(self._alive))
+            self._alive = np.concatenate([self._alive, np.zeros(capacity - len(self._alive), dtype=bool)])
+            for field, codes in self._codes.items():
+                self._codes[field] = np.concatenate([codes, np.full(capacity - len(codes), -1, dtype=np.int32)])
+        self._size = max(self._size, size)
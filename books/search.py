@@ -0,0 +1,252 @@
+import asyncio
+import heapq
+import re
+from bisect import bisect_left, bisect_right, insort
+from collections import Counter, defaultdict
+
+from catalog import normalize
+
+SEARCH_FIELDS = ("title", "author")
+# Most prefix completions (the ones in the most books) and candidate books looked at per
+# query, which keeps very common words and one-letter prefixes from scanning the catalog.
+MAX_COMPLETIONS = 64
+MAX_CANDIDATES = 20000
+
+WORD = re.compile(r"\w+")
+# Sorts after any character a word can contain, so word + LAST_CHAR bounds its completions.
+LAST_CHAR = chr(0x10FFFF)
+
+
+def words_of(book: dict) -> set:
+    words = set()
+    for field in SEARCH_FIELDS:
+        value = normalize(book.get(field))
+        if value is not None:
+            words.update(WORD.findall(value))
+    return words
+
+
+def trigrams(word: str) -> set:
+    padded = f"${word}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def typo_budget(word: str) -> int:
+    """Edits tolerated for a query word: none for short words, more for long ones."""
+    return 0 if len(word) <= 3 else 1 if len(word) <= 7 else 2
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Levenshtein distance capped at limit + 1.
+
+    Uses Myers' bit-parallel algorithm: each column of the dynamic programming
+    table is kept as bit vectors of +1/-1 steps in one int, so the cost is a
+    handful of integer operations per character of `b`.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    if not a:
+        return len(b)
+    matches = {}
+    for i, char in enumerate(a):
+        matches[char] = matches.get(char, 0) | 1 << i
+    mask = (1 << len(a)) - 1
+    last = 1 << (len(a) - 1)
+    plus, minus, distance = mask, 0, len(a)
+    for char in b:
+        equal = matches.get(char, 0)
+        vertical = equal | minus
+        horizontal = (((equal & plus) + plus) ^ plus) | equal
+        horizontal_plus = minus | ~(horizontal | plus)
+        horizontal_minus = plus & horizontal
+        if horizontal_plus & last:
+            distance += 1
+        elif horizontal_minus & last:
+            distance -= 1
+        horizontal_plus = (horizontal_plus << 1) | 1
+        horizontal_minus <<= 1
+        plus = (horizontal_minus | ~(vertical | horizontal_plus)) & mask
+        minus = horizontal_plus & vertical & mask
+    return min(distance, limit + 1)
+
+
+class SearchIndex:
+    """Word index over book titles and authors for prefix and typo-tolerant search.
+
+    Each word maps to the ids of the books containing it. The vocabulary is
+    also kept sorted, so the words starting with a prefix are one bisect away
+    (the flat equivalent of a prefix trie), and every word is listed under its
+    trigrams and length to find words within a few edits of a misspelled one. Words are
+    few compared to books, so fuzzy matching only ever looks at the vocabulary.
+    """
+
+    def __init__(self):
+        self._postings = defaultdict(set)
+        self._vocabulary = []
+        self._trigrams = defaultdict(set)
+        # Ids below this are indexed; build() moves it up to infinity.
+        self._indexed_below = 0
+        # Words new to the vocabulary during changed_many(), sorted in once at the end.
+        self._new_words = None
+
+    @property
+    def ready(self) -> bool:
+        return self._indexed_below == float("inf")
+
+    async def build(self, catalog, chunk: int = 1000):
+        """Index every book in the catalog, yielding to the event loop between chunks.
+
+        Changes to books the build hasn't reached yet are left to the build.
+        """
+        self._indexed_below = 0
+        while self._indexed_below < catalog.next_id:
+            end = min(self._indexed_below + chunk, catalog.next_id)
+            for book_id in range(self._indexed_below, end):
+                book = catalog.get(book_id)
+                if book is not None:
+                    self._add(book_id, book)
+            self._indexed_below = end
+            await asyncio.sleep(0)
+        self._indexed_below = float("inf")
+
+    def changed(self, book_id: int, old, new):
+        """Called by the store with the old and new version of a book, None when absent."""
+        if book_id >= self._indexed_below:
+            return
+        if old is not None:
+            self._remove(book_id, old)
+        if new is not None:
+            self._add(book_id, new)
+
+    def changed_many(self, changes: list):
+        """changed() for a batch of (book_id, old, new), with one vocabulary update."""
+        self._new_words = set()
+        try:
+            for change in changes:
+                self.changed(*change)
+        finally:
+            new_words, self._new_words = self._new_words, None
+            if new_words:
+                self._vocabulary.extend(new_words)
+                self._vocabulary.sort()
+
+    def search(self, query: str, limit: int = 10) -> list:
+        """Ids of the best matching books, best first.
+
+        Every query word has to match a word of the title or author, exactly,
+        as a prefix (only the last word, as it is still being typed) or within
+        its typo budget. Books are ranked by the total cost of their matches:
+        0 for exact, 0.5 for a prefix, otherwise the edit distance. Books with
+        the same cost come back in no particular order.
+        """
+        query_words = WORD.findall(normalize(query) or "")
+        if not query_words:
+            return []
+        # A typo costs at least 1, more than any exact or prefix match, so typos
+        # are only looked for when exact and prefix matches don't fill the page.
+        results = self._rank(query_words, limit, typos=False)
+        if len(results) < limit:
+            results = self._rank(query_words, limit, typos=True)
+        return results
+
+    def stats(self) -> dict:
+        return {
+            "ready": self.ready,
+            "words": len(self._vocabulary),
+            "trigrams": len(self._trigrams),
+        }
+
+    def _rank(self, query_words: list, limit: int, typos: bool) -> list:
+        expansions = [self._expand(word, prefix=index == len(query_words) - 1, typos=typos)
+                      for index, word in enumerate(query_words)]
+        if not all(expansions):
+            return []
+        # Walk the books of the rarest query word and look the others up by id.
+        expansions.sort(key=lambda expansion: sum(len(self._postings[word]) for word in expansion))
+        driver, others = expansions[0], expansions[1:]
+        # The least the other query words can add to a book's cost.
+        floor = sum(min(expansion.values()) for expansion in others)
+        scores = {}
+        for word, cost in sorted(driver.items(), key=lambda item: item[1]):
+            # Books found from here on cost at least `bound`, so stop once `limit` books cost no more.
+            bound = cost + floor
+            good = sum(1 for score in scores.values() if score <= bound)
+            if good >= limit:
+                break
+            for book_id in self._postings[word]:
+                if good >= limit or len(scores) >= MAX_CANDIDATES:
+                    break
+                if book_id in scores and scores[book_id] <= cost:
+                    continue
+                total = cost
+                for expansion in others:
+                    best = min((other_cost for other_word, other_cost in expansion.items()
+                                if book_id in self._postings[other_word]), default=None)
+                    if best is None:
+                        break
+                    total += best
+                else:
+                    if total <= bound and scores.get(book_id, bound + 1) > bound:
+                        good += 1
+                    scores[book_id] = min(total, scores.get(book_id, total))
+        return heapq.nsmallest(limit, scores, key=scores.get)
+
+    def _expand(self, word: str, prefix: bool, typos: bool) -> dict:
+        """Vocabulary words the query word may stand for, with their match cost."""
+        matches = {}
+        if word in self._postings:
+            matches[word] = 0
+        if prefix:
+            # The completions in the most books, not the first ones alphabetically: "ti" should reach "title".
+            start = bisect_left(self._vocabulary, word)
+            completions = self._vocabulary[start:bisect_right(self._vocabulary, word + LAST_CHAR, start)]
+            if len(completions) > MAX_COMPLETIONS:
+                completions = heapq.nlargest(MAX_COMPLETIONS, completions, key=lambda candidate: len(self._postings[candidate]))
+            for candidate in completions:
+                matches.setdefault(candidate, 0.5)
+        budget = typo_budget(word) if typos else 0
+        if budget:
+            grams = trigrams(word)
+            # A word within `budget` edits still shares all but 3 * budget of the trigrams,
+            # and is at most `budget` characters longer or shorter.
+            needed = len(grams) - 3 * budget
+            shared = Counter()
+            for length in range(len(word) - budget, len(word) + budget + 1):
+                for gram in grams:
+                    shared.update(self._trigrams.get((gram, length), ()))
+            for candidate, count in shared.items():
+                if count >= needed and candidate not in matches:
+                    distance = edit_distance(word, candidate, budget)
+                    if distance <= budget:
+                        matches[candidate] = distance
+        return matches
+
+    def _add(self, book_id: int, book: dict):
+        for word in words_of(book):
+            postings = self._postings[word]
+            if not postings:
+                if self._new_words is None:
+                    insort(self._vocabulary, word)
+                else:
+                    self._new_words.add(word)
+                for gram in trigrams(word):
+                    self._trigrams[gram, len(word)].add(word)
+            postings.add(book_id)
+
+    def _remove(self, book_id: int, book: dict):
+        for word in words_of(book):
+            postings = self._postings.get(word)
+            if postings is None:
+                continue
+            postings.discard(book_id)
+            if not postings:
+                del self._postings[word]
+                if self._new_words is not None and word in self._new_words:
+                    self._new_words.discard(word)
+                else:
+                    del self._vocabulary[bisect_left(self._vocabulary, word)]
+                for gram in trigrams(word):
+                    words = self._trigrams[gram, len(word)]
+                    words.discard(word)
+                    if not words:
+                        del self._trigrams[gram, len(word)]
@@ -0,0 +1,414 @@
+import asyncio
+import hashlib
+import json
+import mmap
+import os
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+from contextlib import contextmanager
+from pathlib import Path
+
+from catalog import INDEXED_FIELDS, BookCatalog, normalize
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+FSYNC_INTERVAL_MS = float(os.getenv("BOOKS_FSYNC_INTERVAL_MS", 10))
+SNAPSHOT_EVERY = int(os.getenv("BOOKS_SNAPSHOT_EVERY", 20000))
+
+MAGIC = b"BOOKSNAP"
+
+
+def key_hash(key: str) -> int:
+    """Stable 64-bit hash of an index key; Python's hash() changes per process."""
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8", "surrogatepass"), digest_size=8).digest(), "little")
+
+
+encoder = json.JSONEncoder(separators=(",", ":"))
+
+
+def encode_book(book: dict) -> bytes:
+    return encoder.encode(book).encode()
+
+
+class Snapshot:
+    """Read-only, memory-mapped catalog snapshot.
+
+    Layout: the books as JSON back to back, an offsets array (book i is
+    data[offsets[i]:offsets[i + 1]], empty for a deleted id), and for every
+    indexed field a sorted array of key hashes with the matching ids next to
+    it. A JSON footer records where each section starts. Opening a snapshot
+    only maps the file; books are decoded when they are read and lookups are
+    binary searches over the mapped arrays.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._views = [memoryview(self._map)]
+        view = self._views[0]
+        if len(view) < 16 or view[-8:] != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a books snapshot")
+        footer_length = int.from_bytes(view[-16:-8], "little")
+        footer = json.loads(bytes(view[-16 - footer_length:-16]))
+        if footer["byteorder"] != sys.byteorder:
+            self.close()
+            raise ValueError(f"{path} was written on a {footer['byteorder']}-endian machine")
+        self.seq = footer["seq"]
+        self.next_id = footer["next_id"]
+        self.count = footer["count"]
+        sections = footer["sections"]
+        self._data = self._section(sections["data"])
+        self._offsets = self._section(sections["offsets"], "Q")
+        self._hashes = {field: self._section(sections[f"{field}.hashes"], "Q") for field in INDEXED_FIELDS}
+        self._ids = {field: self._section(sections[f"{field}.ids"], "Q") for field in INDEXED_FIELDS}
+
+    def has(self, book_id: int) -> bool:
+        return book_id < self.next_id and self._offsets[book_id] != self._offsets[book_id + 1]
+
+    def raw(self, book_id: int):
+        return self._data[self._offsets[book_id]:self._offsets[book_id + 1]]
+
+    def book(self, book_id: int):
+        if not self.has(book_id):
+            return None
+        return json.loads(bytes(self.raw(book_id)))
+
+    def ids_for(self, field: str, key) -> list:
+        if key is None:
+            return []
+        hashes, value = self._hashes[field], key_hash(key)
+        start = bisect_left(hashes, value)
+        return self._ids[field][start:bisect_right(hashes, value, start)].tolist()
+
+    def count_for(self, field: str, key) -> int:
+        if key is None:
+            return 0
+        hashes, value = self._hashes[field], key_hash(key)
+        start = bisect_left(hashes, value)
+        return bisect_right(hashes, value, start) - start
+
+    def index_entries(self, field: str):
+        """(key hash, id) pairs of one index, in order."""
+        return zip(self._hashes[field], self._ids[field])
+
+    def close(self):
+        for view in reversed(self._views):
+            view.release()
+        self._map.close()
+        self._file.close()
+
+    def _section(self, bounds, fmt=None):
+        start, length = bounds
+        view = self._views[0][start:start + length]
+        self._views.append(view)
+        if fmt is not None:
+            view = view.cast(fmt)
+            self._views.append(view)
+        return view
+
+
+def write_snapshot(path: Path, seq: int, next_id: int, count: int, base, books: dict, removed: set):
+    """Write base + changes as a new snapshot file. Runs in a worker thread."""
+    changed = books.keys() | removed
+    offsets = array("Q", [0])
+    entries = {field: [] for field in INDEXED_FIELDS}
+    # Authors and categories repeat a lot, so hash each distinct key once.
+    hashes = {}
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "wb") as snapshot:
+        position = 0
+        for book_id in range(next_id):
+            if book_id in books:
+                raw = encode_book(books[book_id])
+                for field in INDEXED_FIELDS:
+                    key = normalize(books[book_id].get(field))
+                    if key is not None:
+                        hashed = hashes.get(key)
+                        if hashed is None:
+                            hashed = hashes[key] = key_hash(key)
+                        entries[field].append((hashed, book_id))
+            elif book_id not in removed and base is not None and base.has(book_id):
+                raw = base.raw(book_id)
+            else:
+                raw = b""
+            snapshot.write(raw)
+            position += len(raw)
+            offsets.append(position)
+        sections = {"data": [0, position]}
+
+        def write_section(name, values: array):
+            nonlocal position
+            padding = -position % 8
+            snapshot.write(b"\0" * padding)
+            position += padding
+            snapshot.write(values.tobytes())
+            sections[name] = [position, len(values) * values.itemsize]
+            position += sections[name][1]
+
+        write_section("offsets", offsets)
+        for field in INDEXED_FIELDS:
+            merged = [] if base is None else [entry for entry in base.index_entries(field) if entry[1] not in changed]
+            # The unchanged base entries are already in order, so this sort is mostly a merge.
+            merged += entries.pop(field)
+            merged.sort()
+            write_section(f"{field}.hashes", array("Q", [key for key, _ in merged]))
+            write_section(f"{field}.ids", array("Q", [book_id for _, book_id in merged]))
+            del merged
+        footer = json.dumps({
+            "seq": seq, "next_id": next_id, "count": count,
+            "byteorder": sys.byteorder, "sections": sections,
+        }).encode()
+        snapshot.write(footer + len(footer).to_bytes(8, "little") + MAGIC)
+        snapshot.flush()
+        os.fsync(snapshot.fileno())
+    os.replace(tmp_path, path)
+    sync_directory(path.parent)
+
+
+def sync_directory(directory: Path):
+    # Makes the rename durable; directories can't be opened like this on Windows.
+    if hasattr(os, "O_DIRECTORY"):
+        fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+class BookStore:
+    """Durable books catalog: an append-only mutation log plus periodic snapshots.
+
+    Every change is applied to the in-memory catalog and appended to the log,
+    which is flushed and fsync'd in batches every `fsync_interval` seconds by
+    `run()`, so a crash loses at most that window of writes. Once
+    `snapshot_every` changes have been logged, a new snapshot is written in a
+    worker thread and the log files it covers are deleted. Recovery maps the
+    newest snapshot and replays the log written after it.
+
+    Log records are JSON lines: [seq, "put", id, book] or [seq, "remove", id].
+
+    Objects in `listeners` are told about every change through
+    `changed(book_id, old, new)`, with None for a missing version. Inside
+    `batch()` they get all of the batch's changes at once through
+    `changed_many(changes)` instead, if they have it.
+    """
+
+    def __init__(self, directory, fsync_interval: float = FSYNC_INTERVAL_MS / 1000,
+                 snapshot_every: int = SNAPSHOT_EVERY):
+        self.directory = Path(directory)
+        self.fsync_interval = fsync_interval
+        self.snapshot_every = snapshot_every
+        self.catalog = None
+        self.seq = 0
+        self.snapshots = 0
+        self.fsyncs = 0
+        self._snapshot_seq = 0
+        self._log = None
+        self._log_path = None
+        self._unsynced = 0
+        self._sync_lock = asyncio.Lock()
+        self._snapshot_task = None
+        self._lock_file = None
+        self.listeners = []
+        # Log records and listener changes held back while a batch() is open.
+        self._pending_records = None
+        self._pending_changes = None
+
+    def open(self, seed=()) -> BookCatalog:
+        """Recover the catalog from disk, or start one from `seed` if there is nothing yet."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._lock()
+        for leftover in self.directory.glob("*.tmp"):
+            leftover.unlink()
+        snapshots = sorted(self.directory.glob("snapshot-*.bin"))
+        base = Snapshot(snapshots[-1]) if snapshots else None
+        for old in snapshots[:-1]:
+            old.unlink()
+        self.catalog = BookCatalog(base=base)
+        self.seq = self._snapshot_seq = base.seq if base is not None else 0
+        logs = sorted(self.directory.glob("log-*.ndjson"))
+        for log_path in logs:
+            self._replay(log_path)
+        self._log_path = self.directory / f"log-{self.seq + 1:020d}.ndjson"
+        self._log = open(self._log_path, "ab")
+        if base is None and not logs:
+            for book in seed:
+                self.add(book)
+        return self.catalog
+
+    def add(self, book: dict) -> int:
+        book_id = self.catalog.add(book)
+        self._append([self._next_seq(), "put", book_id, book])
+        self._notify(book_id, None, book)
+        return book_id
+
+    def replace(self, book_id: int, book: dict):
+        old = self.catalog.get(book_id) if self.listeners else None
+        self.catalog.replace(book_id, book)
+        self._append([self._next_seq(), "put", book_id, book])
+        self._notify(book_id, old, book)
+
+    def remove(self, book_id: int):
+        book = self.catalog.remove(book_id)
+        self._append([self._next_seq(), "remove", book_id])
+        self._notify(book_id, book, None)
+        return book
+
+    @contextmanager
+    def batch(self):
+        """Group changes: their log records are written in one go and listeners get them together.
+
+        The catalog itself is updated as usual, so lookups inside the batch see
+        its earlier changes.
+        """
+        if self._pending_records is not None:
+            yield
+            return
+        self._pending_records, self._pending_changes = [], []
+        try:
+            yield
+        finally:
+            records, changes = self._pending_records, self._pending_changes
+            self._pending_records = self._pending_changes = None
+            if records:
+                self._log.write(b"".join(records))
+                self._unsynced += len(records)
+            for listener in self.listeners:
+                if hasattr(listener, "changed_many"):
+                    listener.changed_many(changes)
+                else:
+                    for change in changes:
+                        listener.changed(*change)
+
+    async def run(self):
+        """Flush and fsync the log in batches; start snapshots when the log is long enough."""
+        while True:
+            await asyncio.sleep(self.fsync_interval)
+            await self.sync()
+            if self.seq - self._snapshot_seq >= self.snapshot_every and self._snapshot_task is None:
+                self._snapshot_task = asyncio.create_task(self.snapshot())
+
+    async def sync(self):
+        if not self._unsynced:
+            return
+        # The lock keeps snapshot() from closing the file while it is being fsync'd.
+        async with self._sync_lock:
+            self._log.flush()
+            self._unsynced = 0
+            self.fsyncs += 1
+            await asyncio.to_thread(os.fsync, self._log.fileno())
+
+    async def snapshot(self):
+        """Write a snapshot of the current catalog without blocking the event loop."""
+        try:
+            seq, base, next_id, count = self.seq, self.catalog.base, self.catalog.next_id, len(self.catalog)
+            books, removed = self.catalog.changes()
+            # Later changes go to a new log file, so every older file is covered by this snapshot.
+            old_log, old_paths = self._log, sorted(self.directory.glob("log-*.ndjson"))
+            self._log_path = self.directory / f"log-{seq + 1:020d}.ndjson"
+            self._log = open(self._log_path, "ab")
+            async with self._sync_lock:
+                old_log.flush()
+                await asyncio.to_thread(os.fsync, old_log.fileno())
+                old_log.close()
+            path = self.directory / f"snapshot-{seq:020d}.bin"
+            await asyncio.to_thread(write_snapshot, path, seq, next_id, count, base, books, removed)
+            self.catalog.rebase(Snapshot(path), books, removed)
+            self._snapshot_seq = seq
+            self.snapshots += 1
+            if base is not None:
+                base.close()
+                base.path.unlink()
+            for log_path in old_paths:
+                if log_path != self._log_path:
+                    log_path.unlink()
+        finally:
+            self._snapshot_task = None
+
+    async def close(self):
+        if self._snapshot_task is not None:
+            await self._snapshot_task
+        await self.sync()
+        if self.seq > self._snapshot_seq:
+            await self.snapshot()
+        self._log.close()
+        if self.catalog.base is not None:
+            self.catalog.base.close()
+        self._lock_file.close()
+
+    def stats(self) -> dict:
+        return {
+            "books": len(self.catalog),
+            "seq": self.seq,
+            "snapshot_seq": self._snapshot_seq,
+            "unsynced": self._unsynced,
+            "fsyncs": self.fsyncs,
+            "snapshots": self.snapshots,
+        }
+
+    def _lock(self):
+        """Keep other processes (e.g. more uvicorn workers) out of the directory while it is open.
+
+        Two stores appending to the same log and deleting each other's files would lose books.
+        The lock goes away with the file handle, so a crashed process never leaves it behind.
+        """
+        self._lock_file = open(self.directory / "lock", "a+b")
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                msvcrt.locking(self._lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            self._lock_file.close()
+            raise RuntimeError(f"{self.directory} is in use by another process; "
+                               "the books app has to run as a single worker") from None
+
+    def _notify(self, book_id: int, old, new):
+        if self._pending_changes is not None:
+            self._pending_changes.append((book_id, old, new))
+            return
+        for listener in self.listeners:
+            listener.changed(book_id, old, new)
+
+    def _next_seq(self) -> int:
+        self.seq += 1
+        return self.seq
+
+    def _append(self, record: list):
+        line = encoder.encode(record).encode() + b"\n"
+        if self._pending_records is not None:
+            self._pending_records.append(line)
+            return
+        self._log.write(line)
+        self._unsynced += 1
+
+    def _replay(self, log_path: Path):
+        valid = 0
+        with open(log_path, "rb") as log:
+            for line in log:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A torn write from a crash; nothing after it was acknowledged as durable.
+                    break
+                if not line.endswith(b"\n"):
+                    break
+                valid += len(line)
+                seq, op, book_id = record[:3]
+                if seq <= self.seq:
+                    continue
+                if op == "put":
+                    self.catalog.put(book_id, record[3])
+                else:
+                    self.catalog.remove(book_id)
+                self.seq = seq
+        if valid < log_path.stat().st_size:
+            with open(log_path, "r+b") as log:
+                log.truncate(valid)
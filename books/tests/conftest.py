@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The books app imports its modules top-level (run from books/).
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
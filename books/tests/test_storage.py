@@ -0,0 +1,145 @@
+import asyncio
+import json
+import random
+
+import pytest
+
+from catalog import normalize
+from storage import BookStore
+
+AUTHORS = ["Ann Leckie", "ann leckie", "N. K. Jemisin", "Ted Chiang", "TED CHIANG"]
+CATEGORIES = ["science fiction", "Fantasy", "history"]
+
+
+def random_book(rng):
+    book = {"title": f"title {rng.randrange(50)}", "author": rng.choice(AUTHORS), "category": rng.choice(CATEGORIES)}
+    if rng.random() < 0.1:
+        del book["category"]
+    return book
+
+
+def random_changes(rng, store, model, count):
+    """Apply `count` random adds, replaces and removes to the store and to a dict model of it."""
+    for _ in range(count):
+        roll = rng.random()
+        if roll < 0.5 or not model:
+            book = random_book(rng)
+            model[store.add(book)] = book
+        elif roll < 0.8:
+            book_id, book = rng.choice(sorted(model)), random_book(rng)
+            store.replace(book_id, book)
+            model[book_id] = book
+        else:
+            book_id = rng.choice(sorted(model))
+            assert store.remove(book_id) == model.pop(book_id)
+
+
+def assert_matches(catalog, model):
+    assert len(catalog) == len(model)
+    assert {book_id: catalog.get(book_id) for book_id in range(catalog.next_id)
+            if catalog.get(book_id) is not None} == model
+    assert catalog.all() == [model[book_id] for book_id in sorted(model)]
+    for author in {normalize(author) for author in AUTHORS}:
+        expected = sorted(book_id for book_id, book in model.items() if normalize(book["author"]) == author)
+        assert catalog.query({"author": [author]}) == expected
+        assert [book for book in catalog.find_all(author=author)] == [model[book_id] for book_id in expected]
+
+
+def crash(store):
+    """Drop a store without closing it: no final sync or snapshot, just the open files released."""
+    store._log.close()
+    if store.catalog.base is not None:
+        store.catalog.base.close()
+    store._lock_file.close()
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_random_changes_match_a_dict_model(tmp_path, seed):
+    rng = random.Random(seed)
+    model = {}
+
+    async def scenario():
+        store = BookStore(tmp_path, fsync_interval=0)
+        store.open()
+        for _ in range(4):
+            random_changes(rng, store, model, 200)
+            assert_matches(store.catalog, model)
+            # Keep changing the catalog while the snapshot is written in its worker thread.
+            snapshot = asyncio.create_task(store.snapshot())
+            for _ in range(10):
+                random_changes(rng, store, model, 5)
+                await asyncio.sleep(0)
+            await snapshot
+            assert_matches(store.catalog, model)
+        random_changes(rng, store, model, 100)
+        await store.close()
+
+        reopened = BookStore(tmp_path)
+        assert_matches(reopened.open(), model)
+        await reopened.close()
+    asyncio.run(scenario())
+
+
+def test_reopening_replays_the_log_after_the_snapshot(tmp_path):
+    rng = random.Random(7)
+    model = {}
+
+    async def scenario():
+        store = BookStore(tmp_path)
+        store.open()
+        random_changes(rng, store, model, 300)
+        await store.snapshot()
+        random_changes(rng, store, model, 300)
+        await store.sync()
+        crash(store)
+
+        reopened = BookStore(tmp_path)
+        assert_matches(reopened.open(), model)
+        assert reopened.seq == 600
+        await reopened.close()
+    asyncio.run(scenario())
+
+
+def test_a_truncated_last_log_line_is_dropped(tmp_path):
+    rng = random.Random(11)
+    model = {}
+
+    async def scenario():
+        store = BookStore(tmp_path)
+        store.open()
+        random_changes(rng, store, model, 50)
+        await store.sync()
+        log_path = store._log_path
+        crash(store)
+        durable_size = log_path.stat().st_size
+        # A crash in the middle of appending the next record.
+        torn = json.dumps([51, "put", 999, {"title": "torn"}]).encode()
+        with open(log_path, "ab") as log:
+            log.write(torn[:len(torn) // 2])
+
+        reopened = BookStore(tmp_path)
+        assert_matches(reopened.open(), model)
+        assert log_path.stat().st_size == durable_size
+        # New records go after the last complete one and survive another reopen.
+        random_changes(rng, reopened, model, 20)
+        await reopened.sync()
+        crash(reopened)
+
+        again = BookStore(tmp_path)
+        assert_matches(again.open(), model)
+        await again.close()
+    asyncio.run(scenario())
+
+
+def test_a_second_store_on_the_same_directory_is_refused(tmp_path):
+    async def scenario():
+        store = BookStore(tmp_path)
+        store.open()
+        with pytest.raises(RuntimeError, match="in use by another process"):
+            BookStore(tmp_path).open()
+        await store.close()
+        # The lock goes with the first store.
+        reopened = BookStore(tmp_path)
+        reopened.open()
+        await reopened.close()
+    asyncio.run(scenario())
@@ -0,0 +1,52 @@
+"""adding owner_id indexes to todos
+
+Revision ID: 3f1c9a7d2b84
+Revises: db4fc2a6cee6
+Create Date: 2026-10-18 09:12:41.305118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f1c9a7d2b84'
+down_revision: Union[str, Sequence[str], None] = 'db4fc2a6cee6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = {
+    'ix_todos_owner_id': ['owner_id'],
+    'ix_todos_owner_id_id': ['owner_id', 'id'],
+    'ix_todos_owner_id_complete_priority': ['owner_id', 'complete', 'priority'],
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    dialect = op.get_bind().dialect.name
+    for name, columns in INDEXES.items():
+        if dialect == 'mysql':
+            # Build the index in place without blocking writes to todos.
+            op.execute(
+                f"CREATE INDEX {name} ON todos ({', '.join(columns)}) "
+                "ALGORITHM=INPLACE LOCK=NONE"
+            )
+        elif dialect == 'postgresql':
+            with op.get_context().autocommit_block():
+                op.create_index(name, 'todos', columns, postgresql_concurrently=True)
+        else:
+            op.create_index(name, 'todos', columns)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    dialect = op.get_bind().dialect.name
+    for name in reversed(list(INDEXES)):
+        if dialect == 'postgresql':
+            with op.get_context().autocommit_block():
+                op.drop_index(name, table_name='todos', postgresql_concurrently=True)
+        else:
+            op.drop_index(name, table_name='todos')
@@ -0,0 +1,47 @@
+"""adding updated_at to todos and todo_tombstones table
+
+Revision ID: 8e2d41c07a5f
+Revises: 3f1c9a7d2b84
+Create Date: 2026-10-18 10:41:07.552310
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8e2d41c07a5f'
+down_revision: Union[str, Sequence[str], None] = '3f1c9a7d2b84'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+Timestamp = sa.DateTime().with_variant(mysql.DATETIME(fsp=6), 'mysql')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('todos', sa.Column('updated_at', Timestamp, nullable=True))
+    # updated_at is stored as naive UTC.
+    now = 'UTC_TIMESTAMP(6)' if op.get_bind().dialect.name == 'mysql' else 'CURRENT_TIMESTAMP'
+    op.execute(sa.text(f"UPDATE todos SET updated_at = {now}"))
+    op.create_index('ix_todos_owner_id_updated_at', 'todos', ['owner_id', 'updated_at'])
+    op.create_table(
+        'todo_tombstones',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('todo_id', sa.Integer(), nullable=False),
+        sa.Column('owner_id', sa.Integer(), nullable=False),
+        sa.Column('deleted_at', Timestamp, nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_todo_tombstones_owner_id_deleted_at', 'todo_tombstones', ['owner_id', 'deleted_at'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_todo_tombstones_owner_id_deleted_at', table_name='todo_tombstones')
+    op.drop_table('todo_tombstones')
+    op.drop_index('ix_todos_owner_id_updated_at', table_name='todos')
+    op.drop_column('todos', 'updated_at')
@@ -0,0 +1,54 @@
+"""adding sync versions to users, todos and todo_tombstones
+
+Revision ID: b7c3e9f1a2d6
+Revises: 8e2d41c07a5f
+Create Date: 2026-10-18 16:20:44.918273
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7c3e9f1a2d6'
+down_revision: Union[str, Sequence[str], None] = '8e2d41c07a5f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def version_column(name: str) -> sa.Column:
+    return sa.Column(name, sa.Integer(), nullable=False, server_default='0')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Existing rows start at version 0, so the first sync after the upgrade returns all of them.
+    op.add_column('users', version_column('sync_version'))
+    if op.get_bind().dialect.name == 'sqlite':
+        # Only a rebuilt table gets AUTOINCREMENT, which stops SQLite reusing deleted ids.
+        with op.batch_alter_table('todos', recreate='always', table_kwargs={'sqlite_autoincrement': True}) as batch:
+            batch.add_column(version_column('version'))
+    else:
+        op.add_column('todos', version_column('version'))
+    op.drop_index('ix_todos_owner_id_updated_at', table_name='todos')
+    op.create_index('ix_todos_owner_id_version', 'todos', ['owner_id', 'version'])
+    op.add_column('todo_tombstones', version_column('version'))
+    op.drop_index('ix_todo_tombstones_owner_id_deleted_at', table_name='todo_tombstones')
+    op.create_index('ix_todo_tombstones_owner_id_version', 'todo_tombstones', ['owner_id', 'version'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_todo_tombstones_owner_id_version', table_name='todo_tombstones')
+    op.create_index('ix_todo_tombstones_owner_id_deleted_at', 'todo_tombstones', ['owner_id', 'deleted_at'])
+    op.drop_column('todo_tombstones', 'version')
+    op.drop_index('ix_todos_owner_id_version', table_name='todos')
+    op.create_index('ix_todos_owner_id_updated_at', 'todos', ['owner_id', 'updated_at'])
+    if op.get_bind().dialect.name == 'sqlite':
+        with op.batch_alter_table('todos') as batch:
+            batch.drop_column('version')
+    else:
+        op.drop_column('todos', 'version')
+    op.drop_column('users', 'sync_version')
@@ -0,0 +1,79 @@
+"""Per-request auth overhead of get_current_user, with and without the token cache.
+
+Run from todo_app/: python benchmarks/bench_auth.py [calls]
+"""
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("TODO_DATABASE_URL", f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/bench.db")
+
+import httpx
+
+import models
+from database import LocalSession
+from main import app
+from routers.auth import create_access_token, get_current_user
+from token_cache import token_cache
+
+
+async def time_calls(token: str, calls: int) -> float:
+    """Mean seconds per get_current_user call."""
+    await get_current_user(token)
+    start = time.perf_counter()
+    for _ in range(calls):
+        await get_current_user(token)
+    return (time.perf_counter() - start) / calls
+
+
+async def time_requests(client, headers: dict, path: str, requests: int) -> list:
+    """Seconds taken by each of `requests` sequential GETs of `path`."""
+    latencies = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        response = await client.get(path, headers=headers)
+        latencies.append(time.perf_counter() - start)
+        assert response.status_code == 200, response.text
+    return latencies
+
+
+async def main(calls: int):
+    async with app.router.lifespan_context(app):
+        results = await compare(calls)
+    print(f"{'':<15}{'get_current_user':>18}{'GET /todo-by-id p50':>22}")
+    for label, (per_call, median) in results.items():
+        print(f"{label:<15}{per_call * 1e6:>15.1f} us{median * 1e6:>19.0f} us")
+
+
+async def compare(calls: int) -> dict:
+    async with LocalSession() as db:
+        user = models.Users(user_name="bench", role="user", hashed_password="x", is_active=True)
+        db.add(user)
+        await db.flush()
+        db.add(models.Todos(title="bench", description="bench", priority=1, complete=False, owner_id=user.id))
+        await db.commit()
+        user_id = user.id
+    token = create_access_token("bench", user_id, "user", timedelta(minutes=20))
+    headers = {"Authorization": f"Bearer {token}"}
+
+    maxsize = token_cache.maxsize
+    results = {}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        for label, size in (("without cache", 0), ("with cache", maxsize)):
+            token_cache.maxsize = size
+            token_cache.clear()
+            per_call = await time_calls(token, calls)
+            # A cached todo, so the request is mostly routing, auth and the response itself.
+            latencies = await time_requests(client, headers, "/todo-by-id/1", calls // 10)
+            results[label] = (per_call, statistics.median(latencies))
+    token_cache.maxsize = maxsize
+    return results
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000))
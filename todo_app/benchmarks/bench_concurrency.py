@@ -0,0 +1,148 @@
+"""Throughput of a todo list route before and after the move to AsyncSession.
+
+"before" is the old setup: a sync Session used inside an `async def` route, so
+every query blocks the event loop. "after" is the current one: an async engine
+and an awaited AsyncSession. Both run the same query against the same SQLite
+file, which sleeps for `--latency-ms` per query through a SQL function to stand
+in for the round trip to a database server.
+
+Run from todo_app/: python benchmarks/bench_concurrency.py [--latency-ms 5] [--requests 400]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("TODO_DATABASE_URL", f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/unused.db")
+
+import httpx
+from fastapi import FastAPI
+from sqlalchemy import create_engine, event, func, select
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker
+
+import models
+from database import Base
+
+CONCURRENCY = (1, 10, 50, 100)
+POOL_SIZE = 20
+
+
+def add_latency(engine):
+    """Registers sleep(ms) on every connection the engine opens."""
+    def sleep(milliseconds):
+        time.sleep(milliseconds / 1000)
+        return 0
+
+    @event.listens_for(engine, "connect")
+    def register(dbapi_connection, connection_record):
+        dbapi_connection.create_function("sleep", 1, sleep)
+
+
+def todos_query(owner_id: int, latency_ms: float):
+    # An uncorrelated subquery, so SQLite sleeps once per statement rather than once per row.
+    delay = select(func.sleep(latency_ms)).scalar_subquery()
+    return select(models.Todos).filter(models.Todos.owner_id == owner_id, delay == 0)
+
+
+def sync_app(path: str, latency_ms: float) -> FastAPI:
+    engine = create_engine(f"sqlite:///{path}", pool_size=POOL_SIZE, connect_args={"check_same_thread": False})
+    add_latency(engine)
+    SessionLocal = sessionmaker(bind=engine, class_=Session)
+    app = FastAPI()
+
+    @app.get("/")
+    async def read_all():
+        with SessionLocal() as db:
+            return [todo.id for todo in db.scalars(todos_query(1, latency_ms))]
+
+    app.state.engine = engine
+    return app
+
+
+def async_app(path: str, latency_ms: float) -> FastAPI:
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}", pool_size=POOL_SIZE)
+    add_latency(engine.sync_engine)
+    LocalSession = async_sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+    app = FastAPI()
+
+    @app.get("/")
+    async def read_all():
+        async with LocalSession() as db:
+            return [todo.id for todo in await db.scalars(todos_query(1, latency_ms))]
+
+    app.state.engine = engine
+    return app
+
+
+async def load(app: FastAPI, concurrency: int, requests: int):
+    """(requests per second, longest event loop stall) for `requests` GETs sent by `concurrency` clients.
+
+    The client runs on the same event loop as the app, so per-request latencies
+    can't show requests queueing behind a blocked loop; a 1 ms ticker measuring
+    how late it wakes up does.
+    """
+    remaining = iter(range(requests))
+    stalls = [0.0]
+    done = asyncio.Event()
+
+    async def client_loop(client):
+        for _ in remaining:
+            response = await client.get("/")
+            assert response.status_code == 200, response.text
+
+    async def ticker():
+        while not done.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(0.001)
+            stalls.append(time.perf_counter() - start - 0.001)
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        await client.get("/")
+        ticking = asyncio.create_task(ticker())
+        start = time.perf_counter()
+        await asyncio.gather(*(client_loop(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+        done.set()
+        await ticking
+    return requests / elapsed, max(stalls)
+
+
+def create_database(path: str):
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    with Session(engine) as db:
+        db.add(models.Users(user_name="bench", role="user", hashed_password="x", is_active=True))
+        db.flush()
+        db.add_all([models.Todos(title=f"todo {i}", description="bench", priority=1, complete=False, owner_id=1)
+                    for i in range(20)])
+        db.commit()
+    engine.dispose()
+
+
+async def main(latency_ms: float, requests: int):
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    create_database(path)
+    print(f"{latency_ms:g} ms per query, {requests} requests per run")
+    print(f"{'':<8}{'clients':>8}{'req/s':>10}{'max loop stall ms':>20}")
+    for label, build in (("before", sync_app), ("after", async_app)):
+        app = build(path, latency_ms)
+        for concurrency in CONCURRENCY:
+            throughput, stall = await load(app, concurrency, requests)
+            print(f"{label:<8}{concurrency:>8}{throughput:>10.0f}{stall * 1000:>20.1f}")
+        engine = app.state.engine
+        if isinstance(engine, AsyncEngine):
+            await engine.dispose()
+        else:
+            engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latency-ms", type=float, default=5)
+    parser.add_argument("--requests", type=int, default=400)
+    arguments = parser.parse_args()
+    asyncio.run(main(arguments.latency_ms, arguments.requests))
@@ -0,0 +1,86 @@
+"""Serializing a list of todos: jsonable_encoder before, the response schemas after.
+
+"before" is what FastAPI does for a route without a response_model:
+jsonable_encoder over the ORM objects, then json.dumps. "after" is what the
+routes do now: validate the rows into TodoResponse through a cached TypeAdapter
+and dump_json in pydantic-core (schemas.json_response), or TodoPage for the
+paged list.
+
+Run from todo_app/: python benchmarks/bench_serialize.py [--rows 1000 10000] [--repeat 7]
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("TODO_DATABASE_URL", f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/unused.db")
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.orm import Session
+
+import models
+from database import Base
+from schemas import TodoPage, TodoResponse, adapter
+
+
+def load_todos(rows: int) -> list:
+    """`rows` Todos loaded from a SQLite file, as the routes get them from the session."""
+    engine = create_engine(f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+    Base.metadata.create_all(engine)
+    with Session(engine, expire_on_commit=False) as db:
+        db.execute(insert(models.Todos.__table__), [
+            {"title": f"todo {i}", "description": "a description of the todo", "priority": i % 5 + 1,
+             "complete": i % 2 == 0, "owner_id": 1, "version": 1} for i in range(rows)
+        ])
+        db.commit()
+        todos = db.scalars(select(models.Todos)).all()
+    engine.dispose()
+    return todos
+
+
+def before(todos: list) -> bytes:
+    return json.dumps(jsonable_encoder(todos)).encode()
+
+
+def after(todos: list) -> bytes:
+    schema_adapter = adapter(list[TodoResponse])
+    return schema_adapter.dump_json(schema_adapter.validate_python(todos, from_attributes=True))
+
+
+def after_page(todos: list) -> bytes:
+    return TodoPage.model_validate({"todos": todos, "next_cursor": None}, from_attributes=True).model_dump_json().encode()
+
+
+def median_ms(serialize, todos: list, repeat: int) -> float:
+    serialize(todos)
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        serialize(todos)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def main(row_counts: list, repeat: int):
+    print(f"{'rows':>8}{'jsonable_encoder':>18}{'TypeAdapter':>14}{'TodoPage':>11}{'speedup':>9}")
+    for rows in row_counts:
+        todos = load_todos(rows)
+        # Same rows either way; the schema only leaves out columns it doesn't declare (version).
+        assert [{key: todo[key] for key in TodoResponse.model_fields} for todo in json.loads(before(todos))] \
+            == json.loads(after(todos))
+        timings = [median_ms(serialize, todos, repeat) for serialize in (before, after, after_page)]
+        print(f"{rows:>8}{timings[0]:>15.1f} ms{timings[1]:>11.1f} ms{timings[2]:>8.1f} ms"
+              f"{timings[0] / timings[1]:>8.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--repeat", type=int, default=7)
+    arguments = parser.parse_args()
+    main(arguments.rows, arguments.repeat)
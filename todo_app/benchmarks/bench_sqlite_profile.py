@@ -0,0 +1,92 @@
+"""Mixed read/write throughput on a SQLite file: default engine vs. the tuned profile.
+
+"default" is a plain create_async_engine on the file: rollback journal, one
+pool for everything. "tuned" is what the app builds with create_engine_for:
+the SQLITE_PRAGMAS (WAL, synchronous=NORMAL, mmap, cache, busy timeout) for
+the writes, plus a second query_only engine for the reads. Writers insert one
+todo per transaction; readers fetch a page of 50 todos.
+
+Run from todo_app/: python benchmarks/bench_sqlite_profile.py [--writers 4] [--readers 8] [--seconds 3]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("TODO_DATABASE_URL", f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/unused.db")
+
+from sqlalchemy import insert, select
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import create_async_engine
+
+import models
+from database import Base, create_engine_for
+
+
+def default_profile(url: str):
+    engine = create_async_engine(url)
+    return engine, engine
+
+
+def tuned_profile(url: str):
+    return create_engine_for(url), create_engine_for(url, read_only=True)
+
+
+async def run_profile(build, writers: int, readers: int, seconds: float) -> dict:
+    url = f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/bench.db"
+    write_engine, read_engine = build(url)
+    async with write_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(insert(models.Todos.__table__), [
+            {"title": f"todo {i}", "description": "description", "priority": 1, "complete": False, "owner_id": 1}
+            for i in range(1000)
+        ])
+    counts = {"writes": 0, "reads": 0, "errors": 0}
+    deadline = time.perf_counter() + seconds
+
+    async def writer():
+        while time.perf_counter() < deadline:
+            try:
+                async with write_engine.begin() as conn:
+                    await conn.execute(insert(models.Todos.__table__), [
+                        {"title": "new todo", "description": "description", "priority": 2, "complete": False,
+                         "owner_id": 1}
+                    ])
+                counts["writes"] += 1
+            except OperationalError:
+                counts["errors"] += 1
+
+    async def reader():
+        page = select(models.Todos).filter(models.Todos.owner_id == 1).order_by(models.Todos.id.desc()).limit(50)
+        while time.perf_counter() < deadline:
+            try:
+                async with read_engine.connect() as conn:
+                    (await conn.execute(page)).all()
+                counts["reads"] += 1
+            except OperationalError:
+                counts["errors"] += 1
+
+    await asyncio.gather(*[writer() for _ in range(writers)], *[reader() for _ in range(readers)])
+    for engine in {write_engine, read_engine}:
+        await engine.dispose()
+    return counts
+
+
+async def main(writers: int, readers: int, seconds: float):
+    print(f"{writers} writers, {readers} readers, {seconds:g} s each")
+    print(f"{'':<10}{'writes/s':>10}{'reads/s':>10}{'errors':>8}")
+    for label, build in (("default", default_profile), ("tuned", tuned_profile)):
+        counts = await run_profile(build, writers, readers, seconds)
+        print(f"{label:<10}{counts['writes'] / seconds:>10.0f}{counts['reads'] / seconds:>10.0f}{counts['errors']:>8}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=3)
+    arguments = parser.parse_args()
+    asyncio.run(main(arguments.writers, arguments.readers, arguments.seconds))
@@ -0,0 +1,222 @@
+import hashlib
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from metrics import CallbackMetric
+
+logger = logging.getLogger(__name__)
+
+CACHE_BACKEND = os.getenv("TODO_CACHE_BACKEND", "memory")
+CACHE_TTL_SECONDS = float(os.getenv("TODO_CACHE_TTL_SECONDS", 60))
+CACHE_URL = os.getenv("TODO_CACHE_URL", "redis://localhost:6379/0")
+CACHE_MAX_BYTES = int(os.getenv("TODO_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+# Same setting database.pool_settings() sizes the pool with; uvicorn reads WEB_CONCURRENCY too.
+# `uvicorn --workers` and `gunicorn -w` export neither, so unset means the count isn't known.
+WEB_WORKERS_SETTING = os.getenv("TODO_WEB_WORKERS", os.getenv("WEB_CONCURRENCY"))
+WEB_WORKERS = int(WEB_WORKERS_SETTING) if WEB_WORKERS_SETTING else None
+
+
+class CacheBackend:
+    """Byte-valued key/value store behind TodoCache.
+
+    `shared` tells whether every worker process sees the same entries.
+    """
+
+    shared = False
+
+    async def get(self, key: str):
+        raise NotImplementedError
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        return {}
+
+
+class MemoryBackend(CacheBackend):
+    """In-process LRU with per-entry TTL, bounded by the total size of the values."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.memory_bytes = 0
+        self._entries = OrderedDict()
+
+    async def get(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires <= time.monotonic():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self.memory_bytes += len(key) + len(value)
+        while self.memory_bytes > self.max_bytes and self._entries:
+            self._remove(next(iter(self._entries)))
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries), "memory_bytes": self.memory_bytes, "max_bytes": self.max_bytes}
+
+    def _remove(self, key: str):
+        _, value = self._entries.pop(key)
+        self.memory_bytes -= len(key) + len(value)
+
+
+class ClientBackend(CacheBackend):
+    """Out-of-process store reached through an async client.
+
+    Any client with redis-style `get(key)` and `set(key, value, ex=seconds)`
+    coroutines works, e.g. redis.asyncio.Redis.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.shared = getattr(client, "shared", True)
+
+    async def get(self, key: str):
+        return await self.client.get(key)
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        await self.client.set(key, value, ex=max(int(ttl), 1))
+
+    def stats(self) -> dict:
+        stats = getattr(self.client, "stats", None)
+        return stats() if stats else {}
+
+
+class LocalKeyValueClient:
+    """Stand-in for a remote key/value server, for local runs and tests."""
+
+    # It still lives in one process, so other workers don't see its entries.
+    shared = False
+
+    def __init__(self):
+        self._data = {}
+
+    async def get(self, key: str):
+        entry = self._data.get(key)
+        if entry is None or entry[0] <= time.monotonic():
+            self._data.pop(key, None)
+            return None
+        return entry[1]
+
+    async def set(self, key: str, value: bytes, ex: int):
+        self._data[key] = (time.monotonic() + ex, value)
+
+    def stats(self) -> dict:
+        return {"entries": len(self._data), "memory_bytes": sum(len(key) + len(value) for key, (_, value) in self._data.items())}
+
+
+class TodoCache:
+    """Caches serialized todo responses per owner.
+
+    Every key embeds the owner's current generation. Invalidating an owner
+    just moves the generation forward, so stale entries are never read again
+    and age out of the backend on their own. Generations are nanosecond
+    timestamps, which keeps them increasing even after an eviction.
+
+    Generations double as the version behind the ETags, which only holds when
+    every worker reads the same generation: with a process-local backend
+    and more than one worker, a write in one worker doesn't move the others'.
+    The cache is then bypassed altogether, since those workers would keep
+    serving their old entries for up to `ttl` seconds. A process-local
+    backend is only used when `workers` is 1; None (not known) counts as
+    possibly several.
+    """
+
+    def __init__(self, backend: CacheBackend, ttl: float, workers: Optional[int] = None):
+        self.backend = backend
+        self.ttl = ttl
+        self.workers = workers
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def shared(self) -> bool:
+        """Whether every worker process sees the same generations."""
+        return self.backend.shared or self.workers == 1
+
+    async def generation(self, owner_id: int) -> str:
+        key = f"todos:{owner_id}:generation"
+        generation = await self.backend.get(key)
+        if generation is None:
+            generation = str(time.time_ns()).encode()
+            await self.backend.set(key, generation, self.ttl * 10)
+        return generation.decode()
+
+    async def invalidate(self, owner_id: int):
+        await self.backend.set(f"todos:{owner_id}:generation", str(time.time_ns()).encode(), self.ttl * 10)
+
+    async def get(self, owner_id: int, generation: str, name: str):
+        if not self.shared:
+            return None
+        value = await self.backend.get(f"todos:{owner_id}:{generation}:{name}")
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def set(self, owner_id: int, generation: str, name: str, value: bytes):
+        if not self.shared:
+            return
+        await self.backend.set(f"todos:{owner_id}:{generation}:{name}", value, self.ttl)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__,
+            "shared": self.shared,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            **self.backend.stats(),
+        }
+
+
+def make_etag(owner_id: int, generation: str, name: str) -> str:
+    """Strong ETag for a cached response, derived from the owner's generation."""
+    digest = hashlib.sha256(f"{owner_id}:{generation}:{name}".encode()).hexdigest()[:32]
+    return f'"{digest}"'
+
+
+def etag_matches(if_none_match, etag) -> bool:
+    if not if_none_match or etag is None:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match uses the weak comparison, so a W/ prefix doesn't matter.
+    return etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+
+
+def create_backend(name: str) -> CacheBackend:
+    if name == "memory":
+        return MemoryBackend(CACHE_MAX_BYTES)
+    if name == "local":
+        return ClientBackend(LocalKeyValueClient())
+    if name == "redis":
+        try:
+            import redis.asyncio
+        except ImportError:
+            raise ValueError("TODO_CACHE_BACKEND=redis needs the redis package: pip install redis")
+        return ClientBackend(redis.asyncio.Redis.from_url(CACHE_URL))
+    raise ValueError(f"Unknown TODO_CACHE_BACKEND {name!r}")
+
+
+todo_cache = TodoCache(create_backend(CACHE_BACKEND), CACHE_TTL_SECONDS, WEB_WORKERS)
+if not todo_cache.shared:
+    logger.warning("Todo response cache and ETags are off: TODO_CACHE_BACKEND=%s lives in one process and "
+                   "TODO_WEB_WORKERS isn't 1. Set TODO_WEB_WORKERS=1 for a single worker, or use redis.",
+                   CACHE_BACKEND)
+CallbackMetric("todo_cache_lookups_total", "Todo response cache lookups by result.", "counter",
+               lambda: {(("result", "hit"),): todo_cache.hits, (("result", "miss"),): todo_cache.misses})
@@ -0,0 +1,63 @@
+import asyncio
+import os
+from collections import defaultdict
+
+SUBSCRIBER_QUEUE_SIZE = int(os.getenv("TODO_EVENTS_QUEUE_SIZE", 100))
+
+
+class Subscription:
+    def __init__(self, owner_id: int, maxsize: int):
+        self.owner_id = owner_id
+        self.queue = asyncio.Queue(maxsize)
+
+
+class ChangeBroker:
+    """In-process pub/sub of todo change events, keyed by owner.
+
+    Publishing never waits: a subscriber whose queue is full is dropped and
+    receives a final None, after which it should reconnect and resync.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.published = 0
+        self.dropped = 0
+        self._subscribers = defaultdict(set)
+
+    def subscribe(self, owner_id: int) -> Subscription:
+        subscription = Subscription(owner_id, self.maxsize)
+        self._subscribers[owner_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscribers = self._subscribers.get(subscription.owner_id)
+        if subscribers is None:
+            return
+        subscribers.discard(subscription)
+        if not subscribers:
+            del self._subscribers[subscription.owner_id]
+
+    def publish(self, owner_id: int, event: dict):
+        self.published += 1
+        for subscription in list(self._subscribers.get(owner_id, ())):
+            try:
+                subscription.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                self._drop(subscription)
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": sum(len(subscribers) for subscribers in self._subscribers.values()),
+            "published": self.published,
+            "dropped": self.dropped,
+        }
+
+    def _drop(self, subscription: Subscription):
+        self.dropped += 1
+        self.unsubscribe(subscription)
+        while not subscription.queue.empty():
+            subscription.queue.get_nowait()
+        subscription.queue.put_nowait(None)
+
+
+todo_events = ChangeBroker(SUBSCRIBER_QUEUE_SIZE)
@@ -0,0 +1,124 @@
+import asyncio
+import heapq
+import itertools
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from passlib.context import CryptContext
+
+from metrics import CallbackMetric, password_duration
+
+bcrypt_context = CryptContext(schemes=['bcrypt'], deprecated='auto')
+
+PASSWORD_WORKERS = int(os.getenv("TODO_PASSWORD_WORKERS", os.cpu_count() or 1))
+# The server has threads running (the database driver, the executor's own
+# manager), and a child forked from it can start with one of their locks held
+# forever. Workers come from a fork server instead, or are spawned where there
+# is none.
+PASSWORD_START_METHOD = os.getenv(
+    "TODO_PASSWORD_START_METHOD",
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn",
+)
+
+# Lower numbers are served first when every worker is busy.
+LOGIN_PRIORITY = 0
+DEFAULT_PRIORITY = 1
+SIGNUP_PRIORITY = 2
+
+
+def _hash(password: str) -> str:
+    return bcrypt_context.hash(password)
+
+
+def _verify(password: str, hashed_password: str) -> bool:
+    return bcrypt_context.verify(password, hashed_password)
+
+
+class PasswordPool:
+    """Runs bcrypt work in worker processes, at most `max_workers` jobs at a time.
+
+    Callers that can't get a slot wait in a priority queue, so logins are
+    handed the next free worker ahead of account creation.
+    """
+
+    def __init__(self, max_workers: int):
+        self.max_workers = max_workers
+        self.running = 0
+        self.max_queue_depth = 0
+        self._executor = None
+        self._waiting = []
+        self._counter = itertools.count()
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(1 for _, _, waiter in self._waiting if not waiter.done())
+
+    def stats(self) -> dict:
+        return {
+            "max_workers": self.max_workers,
+            "running": self.running,
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+        }
+
+    async def run(self, priority: int, fn, *args):
+        await self._acquire(priority)
+        try:
+            loop = asyncio.get_running_loop()
+            start = time.perf_counter()
+            try:
+                return await loop.run_in_executor(self.start(), fn, *args)
+            finally:
+                password_duration.observe(time.perf_counter() - start, fn.__name__.lstrip("_"))
+        finally:
+            self._release()
+
+    def start(self) -> ProcessPoolExecutor:
+        """Create the worker pool. The app does this in its lifespan, before serving."""
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                 mp_context=multiprocessing.get_context(PASSWORD_START_METHOD))
+        return self._executor
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def _acquire(self, priority: int):
+        # Waiters only queue up while every slot is taken.
+        if self.running < self.max_workers:
+            self.running += 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiting, (priority, next(self._counter), waiter))
+        self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            # The slot may have been handed over just before the cancellation.
+            if waiter.done() and not waiter.cancelled():
+                self._release()
+            raise
+
+    def _release(self):
+        # Hand the slot straight to the next waiter instead of freeing it.
+        while self._waiting:
+            _, _, waiter = heapq.heappop(self._waiting)
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.running -= 1
+
+
+password_pool = PasswordPool(PASSWORD_WORKERS)
+CallbackMetric("todo_password_queue_depth", "Password jobs waiting for a worker.", "gauge", lambda: password_pool.queue_depth)
+
+
+async def hash_password(password: str, priority: int = DEFAULT_PRIORITY) -> str:
+    return await password_pool.run(priority, _hash, password)
+
+
+async def verify_password(password: str, hashed_password: str, priority: int = DEFAULT_PRIORITY) -> bool:
+    return await password_pool.run(priority, _verify, password, hashed_password)
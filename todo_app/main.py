@@ -1,13 +1,37 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from routers import auth, todos, admin, user
-from database import engine
+from database import engine, read_engines
+from hashing import password_pool
+from metrics import MetricsMiddleware, render_metrics
+from request_timing import ServerTimingMiddleware
 import models
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    async with engine.begin() as conn:
+        await conn.run_sync(models.Base.metadata.create_all)
+    password_pool.start()
+    yield
+    await todos.todo_inserts.close()
+    password_pool.shutdown()
+    for read_engine in read_engines:
+        if read_engine is not engine:
+            await read_engine.dispose()
+    await engine.dispose()
+
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(ServerTimingMiddleware)
+app.add_middleware(MetricsMiddleware)
 app.include_router(auth.router)
 app.include_router(todos.router)
 app.include_router(admin.router)
 app.include_router(user.router)
-models.Base.metadata.create_all(bind=engine)
 
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,159 @@
+import time
+from bisect import bisect_left
+from collections import defaultdict
+
+# Seconds. Covers cached reads (sub-millisecond) up to slow bcrypt and batch writes.
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Metric:
+    """Base for the collectors below, rendered in the Prometheus text format.
+
+    Collectors are only updated from the event loop thread, so they use
+    plain dicts and no locks; an update is a dict lookup and an addition.
+    """
+
+    type = "untyped"
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        registry.append(self)
+
+    def samples(self):
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        for suffix, labels, value in self.samples():
+            lines.append(f"{self.name}{suffix}{format_labels(labels)} {format_value(value)}")
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        super().__init__(name, help, labels)
+        self.values = defaultdict(float)
+
+    def inc(self, *label_values, amount: float = 1):
+        self.values[label_values] += amount
+
+    def samples(self):
+        for label_values, value in self.values.items():
+            yield "", zip(self.labels, label_values), value
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def dec(self, *label_values, amount: float = 1):
+        self.values[label_values] -= amount
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = buckets
+        # label values -> [count per bucket (last one is +Inf), sum]
+        self.values = {}
+
+    def observe(self, value: float, *label_values):
+        entry = self.values.get(label_values)
+        if entry is None:
+            entry = self.values[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+        # Only the matching bucket is bumped; the cumulative counts are built when scraped.
+        entry[0][bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+
+    def samples(self):
+        for label_values, (counts, total) in self.values.items():
+            labels = list(zip(self.labels, label_values))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                yield "_bucket", labels + [("le", format_value(bound))], cumulative
+            yield "_sum", labels, total
+            yield "_count", labels, cumulative
+
+
+class CallbackMetric(Metric):
+    """Reads its value from existing stats when scraped, so the hot path pays nothing."""
+
+    def __init__(self, name: str, help: str, type: str, callback):
+        super().__init__(name, help)
+        self.type = type
+        self.callback = callback
+
+    def samples(self):
+        value = self.callback()
+        if isinstance(value, dict):
+            for label_values, sample in value.items():
+                yield "", label_values, sample
+        else:
+            yield "", (), value
+
+
+def format_labels(labels) -> str:
+    labels = list(labels)
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in labels)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + "}"
+
+
+def format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+registry = []
+
+
+def render_metrics() -> str:
+    return "\n".join(metric.render() for metric in registry) + "\n"
+
+
+http_requests = Counter("todo_http_requests_total", "HTTP requests by route and status code.", ("method", "route", "status"))
+http_request_duration = Histogram("todo_http_request_duration_seconds", "HTTP request latency by route.", ("method", "route"))
+http_requests_in_flight = Gauge("todo_http_requests_in_flight", "HTTP requests currently being handled.", ("method",))
+db_pool_checkout_wait = Histogram("todo_db_pool_checkout_wait_seconds", "Time spent waiting for a connection from the pool.")
+db_pool_timeouts = Counter("todo_db_pool_checkout_timeouts_total", "Pool checkouts that timed out.")
+password_duration = Histogram("todo_password_duration_seconds", "bcrypt work per operation, excluding time queued for a worker.", ("operation",))
+jwt_decodes = Counter("todo_jwt_decodes_total", "Bearer tokens decoded because they were not in the token cache.", ("result",))
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency, in-flight requests and status codes per route."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        method = scope["method"]
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        http_requests_in_flight.inc(method)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            http_requests_in_flight.dec(method)
+            # The route template, not the raw path, keeps the label set small.
+            route = getattr(scope.get("route"), "path", "unmatched")
+            http_request_duration.observe(time.perf_counter() - start, method, route)
+            http_requests.inc(method, route, str(status_code))
@@ -1,5 +1,15 @@
 from database import Base
-from sqlalchemy import Column, ForeignKey, Integer, String, Boolean
+from datetime import datetime, timezone
+from sqlalchemy import Column, DateTime, ForeignKey, Index, Integer, String, Boolean
+from sqlalchemy.dialects import mysql
+
+# Microsecond precision on MySQL too, so delta-sync tokens order writes finely.
+Timestamp = DateTime().with_variant(mysql.DATETIME(fsp=6), "mysql")
+
+
+def utc_now():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
 
 class Users(Base):
     __tablename__ = "users"
@@ -12,6 +22,8 @@ class Users(Base):
     is_active = Column(Boolean, default=True)
     role = Column(String)
     phone_number = Column(String, nullable=True)
+    # Bumped by every write to the user's todos; see routers.todos.next_sync_version.
+    sync_version = Column(Integer, nullable=False, default=0, server_default="0")
 
 class Todos(Base):
     __tablename__ = "todos"
@@ -21,3 +33,28 @@ class Todos(Base):
     priority = Column(Integer)
     complete = Column(Boolean, default=False)
     owner_id = Column(Integer, ForeignKey("users.id"))
+    updated_at = Column(Timestamp, default=utc_now, onupdate=utc_now)
+    # The owner's sync_version when the row was last written.
+    version = Column(Integer, nullable=False, default=0, server_default="0")
+
+    __table_args__ = (
+        Index("ix_todos_owner_id", "owner_id"),
+        Index("ix_todos_owner_id_id", "owner_id", "id"),
+        Index("ix_todos_owner_id_complete_priority", "owner_id", "complete", "priority"),
+        Index("ix_todos_owner_id_version", "owner_id", "version"),
+        # Ids of deleted todos are never handed out again, so a tombstone can't hide a new todo.
+        # MySQL before 8.0 can still reuse them after a restart.
+        {"sqlite_autoincrement": True},
+    )
+
+class TodoTombstones(Base):
+    __tablename__ = "todo_tombstones"
+    id = Column(Integer, primary_key=True)
+    todo_id = Column(Integer, nullable=False)
+    owner_id = Column(Integer, nullable=False)
+    deleted_at = Column(Timestamp, default=utc_now, nullable=False)
+    version = Column(Integer, nullable=False, default=0, server_default="0")
+
+    __table_args__ = (
+        Index("ix_todo_tombstones_owner_id_version", "owner_id", "version"),
+    )
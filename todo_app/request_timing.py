@@ -0,0 +1,114 @@
+import logging
+import os
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from sqlalchemy import event
+
+SERVER_TIMING = os.getenv("TODO_SERVER_TIMING", "true").lower() in ("1", "true", "yes")
+N_PLUS_ONE_THRESHOLD = int(os.getenv("TODO_N_PLUS_ONE_THRESHOLD", 5))
+
+logger = logging.getLogger(__name__)
+
+
+class RequestTimings:
+    """SQL statements and time spent per phase while handling one request."""
+
+    def __init__(self):
+        self.statements = 0
+        self.statement_counts = Counter()
+        self.phases = {"db": 0.0}
+
+    def add(self, phase: str, elapsed: float):
+        self.phases[phase] = self.phases.get(phase, 0.0) + elapsed
+
+    def repeated_statements(self, threshold: int = N_PLUS_ONE_THRESHOLD) -> list:
+        return [(statement, count) for statement, count in self.statement_counts.items() if count >= threshold]
+
+    def server_timing(self) -> str:
+        metrics = [f'db;dur={self.phases["db"] * 1000:.2f};desc="{self.statements} queries"']
+        metrics += [f"{phase};dur={elapsed * 1000:.2f}" for phase, elapsed in self.phases.items() if phase != "db"]
+        return ", ".join(metrics)
+
+
+current_timings: ContextVar = ContextVar("current_timings", default=None)
+
+
+@contextmanager
+def track_statements():
+    """Collect timings for everything run inside the block, eg: a query budget check."""
+    timings = RequestTimings()
+    token = current_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        current_timings.reset(token)
+
+
+@contextmanager
+def timed(phase: str):
+    timings = current_timings.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(phase, time.perf_counter() - start)
+
+
+def instrument_engine(engine):
+    # The start time goes on the execution context rather than the connection, so a
+    # statement that fails (and never reaches after_cursor_execute) leaves nothing behind.
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context.timing_start = time.perf_counter()
+
+    @event.listens_for(engine.sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        start = getattr(context, "timing_start", None)
+        if start is None:
+            return
+        elapsed = time.perf_counter() - start
+        timings = current_timings.get()
+        if timings is not None:
+            timings.statements += 1
+            timings.statement_counts[statement] += 1
+            timings.add("db", elapsed)
+
+
+class ServerTimingMiddleware:
+    """ASGI middleware that tracks each HTTP request and reports it in Server-Timing.
+
+    Statements repeated N_PLUS_ONE_THRESHOLD or more times in one request are
+    logged as a likely N+1 query.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+
+        with track_statements() as timings:
+            async def send_with_timing(message):
+                if message["type"] == "http.response.start" and SERVER_TIMING:
+                    timings.add("app", time.perf_counter() - start)
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", timings.server_timing().encode()))
+                    message = {**message, "headers": headers}
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_timing)
+            finally:
+                for statement, count in timings.repeated_statements():
+                    logger.warning("Possible N+1 in %s %s: statement ran %d times: %s",
+                                   scope["method"], scope["path"], count, statement)
@@ -1,12 +1,21 @@
+import json
+from datetime import datetime
 from fastapi import APIRouter
-from fastapi import Depends, HTTPException, Path
+from fastapi import Depends, HTTPException, Path, Query
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
-from database import LocalSession
-from typing import Annotated
-from sqlalchemy.orm import Session
+from database import LocalSession, read_session, pool_status
+from hashing import password_pool
+from token_cache import token_cache
+from typing import Annotated, Optional
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
 import models
+from cache import todo_cache
+from schemas import TodoResponse, json_response
 from starlette import status
 from .auth import get_current_user
+from .todos import add_tombstones, next_sync_version, todos_changed
 
 router = APIRouter(
     prefix="/admin",
@@ -14,29 +23,97 @@ router = APIRouter(
 )
 
 
-def get_db():
-    db = LocalSession()
-    try:
+async def get_db(user: Annotated[dict, Depends(get_current_user)]):
+    async with LocalSession(info={"user_id": user.get('id')}) as db:
         yield db
-    finally:
-        db.close()
 
 
-db_dependency = Annotated[Session, Depends(get_db)]
+async def get_read_db(user: Annotated[dict, Depends(get_current_user)]):
+    async with read_session(user.get('id')) as db:
+        yield db
+
+
+db_dependency = Annotated[AsyncSession, Depends(get_db)]
+read_db_dependency = Annotated[AsyncSession, Depends(get_read_db)]
 user_dependency = Annotated[dict, Depends(get_current_user)]
 
-@router.get("/todo", status_code=status.HTTP_200_OK)
-async def read_all(user:user_dependency, db:db_dependency):
+@router.get("/todo", status_code=status.HTTP_200_OK, response_model=list[TodoResponse])
+async def read_all(user:user_dependency, db:read_db_dependency):
     if user is None or user.get('role')!='admin':
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail='Not authorized')
-    return db.query(models.Todos).all()
-    
+    return json_response(list[TodoResponse], (await db.scalars(select(models.Todos))).all())
+
+EXPORT_BATCH_SIZE = 1000
+
+
+async def stream_todos(query, user_id: int):
+    # The export gets its own session because it outlives the request handler.
+    async with read_session(user_id) as db:
+        result = await db.stream(query.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        async for rows in result.partitions():
+            yield "".join(json.dumps(row._asdict(), default=datetime.isoformat) + "\n" for row in rows)
+
+
+@router.get("/todo/export", status_code=status.HTTP_200_OK)
+async def export_todos(
+    user: user_dependency,
+    owner_id: Optional[int] = Query(default=None, gt=0),
+    complete: Optional[bool] = None,
+):
+    if user is None or user.get('role') != 'admin':
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail='Not authorized')
+    query = select(*models.Todos.__table__.columns).order_by(models.Todos.id)
+    if owner_id is not None:
+        query = query.filter(models.Todos.owner_id == owner_id)
+    if complete is not None:
+        query = query.filter(models.Todos.complete == complete)
+    return StreamingResponse(stream_todos(query, user.get('id')), media_type="application/x-ndjson")
+
 @router.delete("/todo/{todo_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_todo(user:user_dependency, db:db_dependency, todo_id:int = Path(gt=0)):
     if user is None or user.get('role') != 'admin':
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail='not authorized')
-    todo_model = db.query(models.Todos).filter(models.Todos.id == todo_id).first()
-    if todo_model is None:
+    # The owner is needed for the sync version, which has to be bumped before the
+    # DELETE so the owner's row is locked first, in the same order as the owner's writes.
+    owner_id = await db.scalar(select(models.Todos.owner_id).filter(models.Todos.id == todo_id))
+    if owner_id is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Todo not found')
-    db.query(models.Todos).filter(models.Todos.id == todo_id).delete()
-    db.commit()
\ No newline at end of file
+    version = await next_sync_version(db, owner_id)
+    result = await db.execute(
+        delete(models.Todos)
+        .filter(models.Todos.id == todo_id)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 0:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Todo not found')
+    await add_tombstones(db, owner_id, [todo_id], version)
+    await db.commit()
+    await todos_changed(owner_id, "deleted", [todo_id])
+
+
+@router.get("/password-pool", status_code=status.HTTP_200_OK)
+async def read_password_pool_stats(user:user_dependency):
+    if user is None or user.get('role') != 'admin':
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail='Not authorized')
+    return password_pool.stats()
+
+
+@router.get("/token-cache", status_code=status.HTTP_200_OK)
+async def read_token_cache_stats(user:user_dependency):
+    if user is None or user.get('role') != 'admin':
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail='Not authorized')
+    return token_cache.stats()
+
+
+@router.get("/db-pool", status_code=status.HTTP_200_OK)
+async def read_db_pool_stats(user:user_dependency):
+    if user is None or user.get('role') != 'admin':
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail='Not authorized')
+    return pool_status()
+
+
+@router.get("/cache", status_code=status.HTTP_200_OK)
+async def read_cache_stats(user:user_dependency):
+    if user is None or user.get('role') != 'admin':
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail='Not authorized')
+    return todo_cache.stats()
\ No newline at end of file
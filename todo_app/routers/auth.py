@@ -2,10 +2,14 @@ from datetime import timedelta, datetime, timezone
 from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
 from models import Users
-from passlib.context import CryptContext
 from database import LocalSession
+from token_cache import token_cache
+from request_timing import timed
+from metrics import jwt_decodes
+from hashing import LOGIN_PRIORITY, SIGNUP_PRIORITY, hash_password, verify_password
 from typing import Annotated
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from starlette import status
 from fastapi.security import OAuth2PasswordRequestForm, OAuth2PasswordBearer
 from jose import jwt, JWTError
@@ -20,16 +24,12 @@ router = APIRouter(
     prefix='/auth',
     tags=['auth']
 )
-bcrypt_context = CryptContext(schemes=['bcrypt'], deprecated='auto')
-def get_db():
-    db = LocalSession()
-    try:
+async def get_db():
+    async with LocalSession() as db:
         yield db
-    finally:
-        db.close()
 
 
-db_dependency = Annotated[Session, Depends(get_db)]
+db_dependency = Annotated[AsyncSession, Depends(get_db)]
 
 class CreateUserRequest(BaseModel):
     username: str
@@ -45,11 +45,11 @@ class Token(BaseModel):
     token_type:str
 
 
-def authenticate_user(username:str, password:str, db):
-    user = db.query(Users).filter(Users.user_name == username).first()
+async def authenticate_user(username:str, password:str, db):
+    user = await db.scalar(select(Users).filter(Users.user_name == username))
     if not user:
         return False
-    if not bcrypt_context.verify(password, user.hashed_password):
+    if not await verify_password(password, user.hashed_password, priority=LOGIN_PRIORITY):
         return False
     return user
     
@@ -60,16 +60,24 @@ def create_access_token(username:str, user_id:int,role:str, expires_delta:timede
     return jwt.encode(encode, SECRET_KEY, algorithm=ALGORITHM)
     
 async def get_current_user(token: Annotated[str, Depends(oauth2_bearer)]):
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_name:str = payload.get('sub')
-        user_id:int = payload.get('id')
-        user_role:str = payload.get('role')
-        if user_id is None or user_name is None or user_role is None:
+    with timed("auth"):
+        cached_user = token_cache.get(token)
+        if cached_user is not None:
+            return cached_user
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+            jwt_decodes.inc("ok")
+            user_name:str = payload.get('sub')
+            user_id:int = payload.get('id')
+            user_role:str = payload.get('role')
+            if user_id is None or user_name is None or user_role is None:
+                raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Unauthorized')
+            current_user = {"username":user_name, "id":user_id,"role":user_role}
+            token_cache.set(token, current_user, payload.get('exp'))
+            return current_user
+        except JWTError:
+            jwt_decodes.inc("invalid")
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Unauthorized')
-        return {"username":user_name, "id":user_id,"role":user_role}
-    except JWTError:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Unauthorized')
 
         
 
@@ -80,19 +88,21 @@ async def create_user(user: CreateUserRequest, db:db_dependency):
         user_name = user.username,
         first_name = user.first_name,
         last_name = user.last_name,
-        hashed_password = bcrypt_context.hash(user.password),
+        hashed_password = await hash_password(user.password, priority=SIGNUP_PRIORITY),
         role = user.role,
         is_active = True,
         phone_number = user.phone_number,
     )
     db.add(create_user_model)
-    db.commit()
+    await db.commit()
     
 
 @router.post("/token/", response_model=Token)
 async def login_for_refresh_token(form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
     db:db_dependency):
-        user = authenticate_user(form_data.username, form_data.password, db)
+        # Credentials are checked on the primary: a lagging replica would reject a
+        # user who just signed up and keep accepting a password that was just changed.
+        user = await authenticate_user(form_data.username, form_data.password, db)
         if not user:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Failed to authenticate user')
         token_str = create_access_token(username=user.user_name, user_id=user.id,role=user.role, expires_delta=timedelta(minutes=20))
@@ -1,25 +1,39 @@
 from fastapi import APIRouter
-from fastapi import Depends, HTTPException, Path
-from pydantic import BaseModel, Field
-from database import LocalSession
-from typing import Annotated
-from sqlalchemy.orm import Session
+import asyncio
+import base64
+import json
+from fastapi import Body, Depends, Header, HTTPException, Path, Query, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field, ValidationError
+from database import LocalSession, engine, mark_recent_writer, read_session
+from typing import Annotated, Literal, Optional
+from sqlalchemy import and_, delete, insert, or_, select, update
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
 import models
+from cache import etag_matches, make_etag, todo_cache
+from events import todo_events
+from request_timing import timed
+from write_coalescer import COALESCE_MAX_BATCH, COALESCE_WINDOW_MS, COALESCE_WRITES, InsertCoalescer
+from schemas import TodoChanges, TodoPage, TodoResponse, json_response
 from starlette import status
 from .auth import get_current_user
 
 router = APIRouter()
 
 
-def get_db():
-    db = LocalSession()
-    try:
+async def get_db(user: Annotated[dict, Depends(get_current_user)]):
+    async with LocalSession(info={"user_id": user.get('id')}) as db:
+        yield db
+
+
+async def get_read_db(user: Annotated[dict, Depends(get_current_user)]):
+    async with read_session(user.get('id')) as db:
         yield db
-    finally:
-        db.close()
 
 
-db_dependency = Annotated[Session, Depends(get_db)]
+db_dependency = Annotated[AsyncSession, Depends(get_db)]
+read_db_dependency = Annotated[AsyncSession, Depends(get_read_db)]
 user_dependency = Annotated[dict, Depends(get_current_user)]
 
 class TodoRequest(BaseModel):
@@ -29,61 +43,516 @@ class TodoRequest(BaseModel):
     complete: bool
 
 
-@router.get("/", status_code=status.HTTP_200_OK)
-async def get_all_todos(user: user_dependency,db: db_dependency):
+class TodoBatchUpdateRequest(TodoRequest):
+    id: int = Field(gt=0)
+
+
+MAX_BATCH_SIZE = 10000
+
+
+class TodoIdsRequest(BaseModel):
+    ids: list[int] = Field(min_length=1, max_length=MAX_BATCH_SIZE)
+
+
+TodoSort = Literal["id", "-id", "priority", "-priority"]
+
+
+def encode_cursor(sort: TodoSort, todo: models.Todos) -> str:
+    key = [todo.id] if sort.lstrip("-") == "id" else [todo.priority, todo.id]
+    raw = json.dumps({"sort": sort, "key": key}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(sort: TodoSort, cursor: str) -> list:
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        key = data["key"]
+        valid = data["sort"] == sort and all(isinstance(value, int) for value in key)
+    except (ValueError, TypeError, KeyError):
+        valid = False
+    if not valid or len(key) != (1 if sort.lstrip("-") == "id" else 2):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    return key
+
+
+def keyset_filter(sort: TodoSort, key: list):
+    descending = sort.startswith("-")
+    if len(key) == 1:
+        return models.Todos.id < key[0] if descending else models.Todos.id > key[0]
+    priority, todo_id = key
+    if descending:
+        return or_(models.Todos.priority < priority,
+                   and_(models.Todos.priority == priority, models.Todos.id < todo_id))
+    return or_(models.Todos.priority > priority,
+               and_(models.Todos.priority == priority, models.Todos.id > todo_id))
+
+
+def cached_response(content: bytes, etag: Optional[str]) -> Response:
+    headers = {"Cache-Control": "private, no-cache"}
+    if etag is not None:
+        headers["ETag"] = etag
+    return Response(content=content, media_type="application/json", headers=headers)
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag, "Cache-Control": "private, no-cache"})
+
+
+@router.get("/", status_code=status.HTTP_200_OK, response_model=TodoPage)
+async def get_all_todos(
+    user: user_dependency,
+    db: read_db_dependency,
+    limit: int = Query(default=50, gt=0, le=500),
+    after: Optional[str] = Query(default=None, description="next_cursor returned by the previous page"),
+    complete: Optional[bool] = None,
+    priority: Optional[int] = Query(default=None, gt=0, lt=6),
+    sort: TodoSort = "id",
+    if_none_match: Optional[str] = Header(default=None),
+):
     if user is None:
         raise HTTPException(status_code = status.HTTP_401_UNAUTHORIZED, detail = 'Authentication failed')
-    return db.query(models.Todos).filter(models.Todos.owner_id == user.get('id')).all()
+    generation = await todo_cache.generation(user.get('id'))
+    cache_key = f"list:{limit}:{after}:{complete}:{priority}:{sort}"
+    # Without a generation shared by all workers, another worker's write wouldn't change the tag.
+    etag = make_etag(user.get('id'), generation, cache_key) if todo_cache.shared else None
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    cached = await todo_cache.get(user.get('id'), generation, cache_key)
+    if cached is not None:
+        return cached_response(cached, etag)
+    query = select(models.Todos).filter(models.Todos.owner_id == user.get('id'))
+    if complete is not None:
+        query = query.filter(models.Todos.complete == complete)
+    if priority is not None:
+        query = query.filter(models.Todos.priority == priority)
+    if after is not None:
+        query = query.filter(keyset_filter(sort, decode_cursor(sort, after)))
+    order_by = [models.Todos.id] if sort.lstrip("-") == "id" else [models.Todos.priority, models.Todos.id]
+    if sort.startswith("-"):
+        order_by = [column.desc() for column in order_by]
+    # Fetch one extra row to find out whether there is a next page.
+    todos = (await db.scalars(query.order_by(*order_by).limit(limit + 1))).all()
+    next_cursor = encode_cursor(sort, todos[limit - 1]) if len(todos) > limit else None
+    with timed("serialize"):
+        content = TodoPage.model_validate(
+            {"todos": todos[:limit], "next_cursor": next_cursor}, from_attributes=True
+        ).model_dump_json().encode()
+    await todo_cache.set(user.get('id'), generation, cache_key, content)
+    return cached_response(content, etag)
 
 
-@router.get("/todo-by-id/{todo_id}", status_code=status.HTTP_200_OK)
+@router.get("/todo-by-id/{todo_id}", status_code=status.HTTP_200_OK, response_model=TodoResponse)
 async def get_todo_by_id(
     user: user_dependency,
-    db: db_dependency,
+    db: read_db_dependency,
     todo_id: int = Path(gt=0, description="id must be greater than 0"),
+    if_none_match: Optional[str] = Header(default=None),
 ):
     if user is None:
         raise HTTPException(status_code = status.HTTP_401_UNAUTHORIZED, detail = 'Authentication failed')
-    todo_model = db.query(models.Todos).filter(models.Todos.id == todo_id).filter(models.Todos.owner_id == user.get('id')).first()
+    generation = await todo_cache.generation(user.get('id'))
+    etag = make_etag(user.get('id'), generation, f"item:{todo_id}") if todo_cache.shared else None
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    cached = await todo_cache.get(user.get('id'), generation, f"item:{todo_id}")
+    if cached is not None:
+        return cached_response(cached, etag)
+    todo_model = await db.scalar(select(models.Todos).filter(models.Todos.id == todo_id).filter(models.Todos.owner_id == user.get('id')))
     if todo_model is not None:
-        return todo_model
+        with timed("serialize"):
+            content = TodoResponse.model_validate(todo_model).model_dump_json().encode()
+        await todo_cache.set(user.get('id'), generation, f"item:{todo_id}", content)
+        return cached_response(content, etag)
     else:
         raise HTTPException(status_code=404, detail="Todo not found")
 
 
+# Opt-in group commit for POST /todo, see TODO_COALESCE_WRITES.
+todo_inserts = InsertCoalescer(models.Todos.__table__, LocalSession, COALESCE_WINDOW_MS / 1000, COALESCE_MAX_BATCH,
+                              prepare=lambda db, rows: stamp_sync_versions(db, rows))
+
+
 @router.post("/todo", status_code=status.HTTP_201_CREATED)
 async def add_todo_item(user:user_dependency, db: db_dependency, todo: TodoRequest):
     if user is None:
         raise HTTPException(status_code = status.HTTP_401_UNAUTHORIZED, detail = 'Authentication failed')
+    todo_ids = None
     try:
-        todo_model = models.Todos(**todo.model_dump(), owner_id = user.get('id'))
-        db.add(todo_model)
-        db.commit()
+        if COALESCE_WRITES:
+            await todo_inserts.insert({**todo.model_dump(), "owner_id": user.get('id')})
+            mark_recent_writer(user.get('id'))
+        else:
+            version = await next_sync_version(db, user.get('id'))
+            todo_model = models.Todos(**todo.model_dump(), owner_id = user.get('id'), version = version)
+            db.add(todo_model)
+            await db.commit()
+            todo_ids = [todo_model.id]
     except Exception:
         raise HTTPException(status_code=500, detail="Failed to add todo")
+    await todos_changed(user.get('id'), "created", todo_ids)
 
 
 @router.put("/todo/update/{todo_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def update_todo(user: user_dependency,db: db_dependency, todo: TodoRequest, todo_id: int = Path(gt=0)):
     if user is None:
         raise HTTPException(status_code = status.HTTP_401_UNAUTHORIZED, detail = 'Authentication failed')
-    current_todo = db.query(models.Todos).filter(models.Todos.id == todo_id).filter(models.Todos.owner_id == user.get('id')).first()
-    if current_todo is None:
+    version = await next_sync_version(db, user.get('id'))
+    result = await db.execute(
+        update(models.Todos)
+        .filter(models.Todos.id == todo_id)
+        .filter(models.Todos.owner_id == user.get('id'))
+        .values(**todo.model_dump(), version=version)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 0:
         raise HTTPException(status_code=404, detail="Todo doesnot exist")
-    current_todo.title = todo.title
-    current_todo.description = todo.description
-    current_todo.priority = todo.priority
-    current_todo.complete = todo.complete
-    db.add(current_todo)
-    db.commit()
+    await db.commit()
+    await todos_changed(user.get('id'), "updated", [todo_id])
 
 
 @router.delete("/todo/{todo_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_todo(user:user_dependency, db: db_dependency, todo_id: int = Path(gt=0)):
     if user is None:
         raise HTTPException(status_code = status.HTTP_401_UNAUTHORIZED, detail = 'Authentication failed')
-    todo_to_delete = db.query(models.Todos).filter(models.Todos.id == todo_id).filter(models.Todos.owner_id == user.get('id')).first()
-    if todo_to_delete is None:
+    version = await next_sync_version(db, user.get('id'))
+    result = await db.execute(
+        delete(models.Todos)
+        .filter(models.Todos.id == todo_id)
+        .filter(models.Todos.owner_id == user.get('id'))
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 0:
         raise HTTPException(status_code=404, detail="Todo not found!")
-    db.query(models.Todos).filter(models.Todos.id == todo_id).delete()
-    db.commit()
+    await add_tombstones(db, user.get('id'), [todo_id], version)
+    await db.commit()
+    await todos_changed(user.get('id'), "deleted", [todo_id])
+
+
+async def todos_changed(owner_id: int, change: str, todo_ids=None):
+    """Run after every committed write to an owner's todos.
+
+    `todo_ids` is None when the ids aren't known, e.g. after a bulk insert.
+    """
+    await todo_cache.invalidate(owner_id)
+    todo_events.publish(owner_id, {"type": change, "ids": todo_ids})
+
+
+async def next_sync_version(db: AsyncSession, owner_id: int) -> int:
+    """Bump the owner's sync version and return it, for the rows this transaction writes.
+
+    Call it before writing: the bump holds the owner's row lock until the
+    commit, so an owner's versions commit in order and every version up to
+    the one stored on the user is already visible to /todo/changes.
+    """
+    statement = (
+        update(models.Users)
+        .filter(models.Users.id == owner_id)
+        .values(sync_version=models.Users.sync_version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    if engine.dialect.update_returning:
+        return await db.scalar(statement.returning(models.Users.sync_version))
+    await db.execute(statement)
+    return await db.scalar(select(models.Users.sync_version).filter(models.Users.id == owner_id))
+
+
+async def stamp_sync_versions(db: AsyncSession, rows: list):
+    """Give coalesced rows, which may belong to several owners, their owner's next version."""
+    versions = {}
+    for owner_id in sorted({row["owner_id"] for row in rows}):
+        versions[owner_id] = await next_sync_version(db, owner_id)
+    for row in rows:
+        row["version"] = versions[row["owner_id"]]
+
+
+async def add_tombstones(db: AsyncSession, owner_id: int, todo_ids, version: int):
+    # Lets /todo/changes report deletions to clients that synced earlier.
+    await db.execute(
+        insert(models.TodoTombstones.__table__),
+        [{"todo_id": todo_id, "owner_id": owner_id, "version": version} for todo_id in todo_ids],
+    )
+
+
+async def owned_todo_ids(db: AsyncSession, owner_id: int, todo_ids) -> set:
+    result = await db.scalars(
+        select(models.Todos.id)
+        .filter(models.Todos.owner_id == owner_id)
+        .filter(models.Todos.id.in_(set(todo_ids)))
+    )
+    return set(result)
+
+
+@router.post("/todo/batch", status_code=status.HTTP_201_CREATED)
+async def add_todo_items(
+    user: user_dependency,
+    db: db_dependency,
+    todos: Annotated[list[TodoRequest], Body(min_length=1, max_length=MAX_BATCH_SIZE)],
+):
+    if user is None:
+        raise HTTPException(status_code = status.HTTP_401_UNAUTHORIZED, detail = 'Authentication failed')
+    try:
+        version = await next_sync_version(db, user.get('id'))
+        rows = [{**todo.model_dump(), "owner_id": user.get('id'), "version": version} for todo in todos]
+        # One executemany; no RETURNING so SQLite and MySQL keep batching rows.
+        await db.execute(insert(models.Todos.__table__), rows)
+        await db.commit()
+    except Exception:
+        raise HTTPException(status_code=500, detail="Failed to add todos")
+    await todos_changed(user.get('id'), "created")
+    return {"results": [{"index": index, "status": "created"} for index in range(len(rows))]}
+
+
+@router.put("/todo/batch", status_code=status.HTTP_200_OK)
+async def update_todos(
+    user: user_dependency,
+    db: db_dependency,
+    todos: Annotated[list[TodoBatchUpdateRequest], Body(min_length=1, max_length=MAX_BATCH_SIZE)],
+):
+    if user is None:
+        raise HTTPException(status_code = status.HTTP_401_UNAUTHORIZED, detail = 'Authentication failed')
+    owned = await owned_todo_ids(db, user.get('id'), [todo.id for todo in todos])
+    if owned:
+        version = await next_sync_version(db, user.get('id'))
+        rows = [{**todo.model_dump(), "version": version} for todo in todos if todo.id in owned]
+        # Bulk UPDATE by primary key, executed as one executemany.
+        await db.execute(update(models.Todos), rows)
+        await db.commit()
+        await todos_changed(user.get('id'), "updated", sorted(owned))
+    return {"results": [{"id": todo.id, "status": "updated" if todo.id in owned else "not_found"} for todo in todos]}
+
+
+@router.post("/todo/batch/complete", status_code=status.HTTP_200_OK)
+async def complete_todos(user: user_dependency, db: db_dependency, request: TodoIdsRequest):
+    if user is None:
+        raise HTTPException(status_code = status.HTTP_401_UNAUTHORIZED, detail = 'Authentication failed')
+    owned = await owned_todo_ids(db, user.get('id'), request.ids)
+    if owned:
+        version = await next_sync_version(db, user.get('id'))
+        await db.execute(
+            update(models.Todos)
+            .filter(models.Todos.id.in_(owned))
+            .values(complete=True, version=version)
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+        await todos_changed(user.get('id'), "updated", sorted(owned))
+    return {"results": [{"id": todo_id, "status": "completed" if todo_id in owned else "not_found"} for todo_id in request.ids]}
+
+
+@router.post("/todo/batch/delete", status_code=status.HTTP_200_OK)
+async def delete_todos(user: user_dependency, db: db_dependency, request: TodoIdsRequest):
+    if user is None:
+        raise HTTPException(status_code = status.HTTP_401_UNAUTHORIZED, detail = 'Authentication failed')
+    owned = await owned_todo_ids(db, user.get('id'), request.ids)
+    if owned:
+        version = await next_sync_version(db, user.get('id'))
+        await db.execute(
+            delete(models.Todos)
+            .filter(models.Todos.id.in_(owned))
+            .execution_options(synchronize_session=False)
+        )
+        await add_tombstones(db, user.get('id'), owned, version)
+        await db.commit()
+        await todos_changed(user.get('id'), "deleted", sorted(owned))
+    return {"results": [{"id": todo_id, "status": "deleted" if todo_id in owned else "not_found"} for todo_id in request.ids]}
+
+
+
+def encode_sync_token(version: int) -> str:
+    return base64.urlsafe_b64encode(str(version).encode()).decode()
+
+
+def decode_sync_token(token: str) -> int:
+    try:
+        version = int(base64.urlsafe_b64decode(token.encode()).decode())
+    except ValueError:
+        version = -1
+    if version < 0:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid sync token")
+    return version
+
+
+@router.get("/todo/changes", status_code=status.HTTP_200_OK, response_model=TodoChanges)
+async def get_todo_changes(
+    user: user_dependency,
+    db: read_db_dependency,
+    since: Optional[str] = Query(default=None, description="sync_token returned by the previous call"),
+):
+    if user is None:
+        raise HTTPException(status_code = status.HTTP_401_UNAUTHORIZED, detail = 'Authentication failed')
+    owner_id = user.get('id')
+    since_version = decode_sync_token(since) if since is not None else None
+    # Every version up to the user's current one has committed (see next_sync_version), so
+    # reading up to it and handing it out as the token skips nothing and sends nothing twice.
+    current = await db.scalar(select(models.Users.sync_version).filter(models.Users.id == owner_id)) or 0
+    changed = []
+    tombstones = []
+    if since_version is None or since_version < current:
+        query = (
+            select(models.Todos)
+            .filter(models.Todos.owner_id == owner_id)
+            .filter(models.Todos.version <= current)
+        )
+        if since_version is not None:
+            query = query.filter(models.Todos.version > since_version)
+            tombstones = (await db.execute(
+                select(models.TodoTombstones.todo_id, models.TodoTombstones.version)
+                .filter(models.TodoTombstones.owner_id == owner_id)
+                .filter(models.TodoTombstones.version > since_version)
+                .filter(models.TodoTombstones.version <= current)
+            )).all()
+        changed = (await db.scalars(query.order_by(models.Todos.id))).all()
+    # A todo written after its id was deleted (ids can come back on MySQL before 8.0) is not deleted.
+    versions = {todo.id: todo.version for todo in changed}
+    deleted = {tombstone.todo_id for tombstone in tombstones if tombstone.version > versions.get(tombstone.todo_id, -1)}
+    return json_response(TodoChanges, {
+        "changed": changed,
+        "deleted": sorted(deleted),
+        # A replica behind the one the client last synced from must not move the token back.
+        "sync_token": encode_sync_token(max(current, since_version or 0)),
+    })
+
+
+
+EVENTS_HEARTBEAT_SECONDS = 15
+
+
+@router.get("/todo/events", status_code=status.HTTP_200_OK)
+async def stream_todo_events(user: user_dependency, request: Request):
+    if user is None:
+        raise HTTPException(status_code = status.HTTP_401_UNAUTHORIZED, detail = 'Authentication failed')
+
+    async def event_stream():
+        subscription = todo_events.subscribe(user.get('id'))
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), EVENTS_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    yield ": keep-alive\n\n"
+                    continue
+                if event is None:
+                    # Dropped as a slow consumer; the client reconnects and resyncs.
+                    return
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            todo_events.unsubscribe(subscription)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+
+class TodoCommand(BaseModel):
+    id: Optional[int | str] = Field(default=None, description="echoed back in the acknowledgement")
+    op: Literal["create", "update", "complete", "delete"]
+    todo_id: Optional[int] = Field(default=None, gt=0)
+    todo: Optional[TodoRequest] = None
+
+
+async def apply_todo_command(db: AsyncSession, owner_id: int, command: TodoCommand, version: int):
+    """Apply one command in the caller's transaction; returns (ack, created todo)."""
+    if command.op == "create":
+        if command.todo is None:
+            return {"id": command.id, "ok": False, "error": "todo is required"}, None
+        todo_model = models.Todos(**command.todo.model_dump(), owner_id=owner_id, version=version)
+        db.add(todo_model)
+        return {"id": command.id, "ok": True}, todo_model
+    if command.todo_id is None:
+        return {"id": command.id, "ok": False, "error": "todo_id is required"}, None
+    owned = (models.Todos.id == command.todo_id, models.Todos.owner_id == owner_id)
+    if command.op == "update":
+        if command.todo is None:
+            return {"id": command.id, "ok": False, "error": "todo is required"}, None
+        statement = update(models.Todos).filter(*owned).values(**command.todo.model_dump(), version=version)
+    elif command.op == "complete":
+        statement = update(models.Todos).filter(*owned).values(complete=True, version=version)
+    else:
+        statement = delete(models.Todos).filter(*owned)
+    result = await db.execute(statement.execution_options(synchronize_session=False))
+    if result.rowcount == 0:
+        return {"id": command.id, "ok": False, "todo_id": command.todo_id, "error": "Todo not found"}, None
+    if command.op == "delete":
+        await add_tombstones(db, owner_id, [command.todo_id], version)
+    return {"id": command.id, "ok": True, "todo_id": command.todo_id}, None
+
+
+def command_id(raw_command):
+    return raw_command.get("id") if isinstance(raw_command, dict) else None
+
+
+@router.websocket("/todo/ws")
+async def todo_commands(websocket: WebSocket):
+    """Command channel for interactive clients.
+
+    The first message is {"token": "<access token>"}. After that every message
+    is one command or a list of commands; each message is applied in one
+    session and one commit, and answered with one acknowledgement per command.
+    """
+    await websocket.accept()
+    try:
+        token = (await websocket.receive_json()).get("token")
+        user = await get_current_user(token)
+    except (HTTPException, ValueError, KeyError, AttributeError):
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    await websocket.send_json({"ok": True, "user_id": user.get('id')})
+    try:
+        while True:
+            try:
+                message = await websocket.receive_json()
+            except (ValueError, KeyError, TypeError):
+                await websocket.send_json([{"id": None, "ok": False, "error": "Invalid JSON"}])
+                continue
+            try:
+                # Cheap thanks to the token cache, and stops the channel once the token expires.
+                await get_current_user(token)
+            except HTTPException:
+                await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+                return
+            raw_commands = message if isinstance(message, list) else [message]
+            if len(raw_commands) > MAX_BATCH_SIZE:
+                await websocket.send_json([{"id": None, "ok": False,
+                                            "error": f"At most {MAX_BATCH_SIZE} commands per message"}])
+                continue
+            acks = []
+            created = []
+            changes = {"created": [], "updated": [], "deleted": []}
+            async with LocalSession(info={"user_id": user.get('id')}) as db:
+                try:
+                    version = await next_sync_version(db, user.get('id'))
+                    for raw_command in raw_commands:
+                        try:
+                            command = TodoCommand.model_validate(raw_command)
+                        except ValidationError as error:
+                            acks.append({"id": command_id(raw_command), "ok": False,
+                                         "error": error.errors(include_url=False, include_context=False)})
+                            continue
+                        ack, todo_model = await apply_todo_command(db, user.get('id'), command, version)
+                        acks.append(ack)
+                        if todo_model is not None:
+                            created.append((ack, todo_model))
+                        elif ack["ok"]:
+                            changes["updated" if command.op == "complete" else command.op + "d"].append(command.todo_id)
+                    await db.commit()
+                except SQLAlchemyError:
+                    # The whole message shares one transaction, so none of it was saved.
+                    await db.rollback()
+                    await websocket.send_json([{"id": command_id(raw_command), "ok": False, "error": "Failed to save"}
+                                               for raw_command in raw_commands])
+                    continue
+            for ack, todo_model in created:
+                ack["todo_id"] = todo_model.id
+                changes["created"].append(todo_model.id)
+            for change, todo_ids in changes.items():
+                if todo_ids:
+                    await todos_changed(user.get('id'), change, todo_ids)
+            await websocket.send_json(acks)
+    except WebSocketDisconnect:
+        return
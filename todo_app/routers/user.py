@@ -1,25 +1,31 @@
 from posixpath import curdir
 from fastapi import APIRouter
-from fastapi import Depends, HTTPException, Path
+from fastapi import Depends, Header, HTTPException, Path, Response
 from pydantic import BaseModel, Field
-from database import LocalSession
-from typing import Annotated
-from sqlalchemy.orm import Session
+from database import LocalSession, read_session
+from typing import Annotated, Optional
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 import models
+from cache import etag_matches, make_etag, todo_cache
+from schemas import UserResponse, json_response
 from starlette import status
-from .auth import bcrypt_context, get_current_user
+from hashing import hash_password, verify_password
+from .auth import get_current_user
 
 router = APIRouter(
     prefix="/users",
     tags=["Users"],
 )
 
-def get_db():
-    db = LocalSession()
-    try:
+async def get_db(user: Annotated[dict, Depends(get_current_user)]):
+    async with LocalSession(info={"user_id": user.get('id')}) as db:
+        yield db
+
+
+async def get_read_db(user: Annotated[dict, Depends(get_current_user)]):
+    async with read_session(user.get('id')) as db:
         yield db
-    finally:
-        db.close()
 
 class ChangePassword(BaseModel):
     old_password: str = Field(min_length=8, max_length=36)
@@ -29,39 +35,49 @@ class ChangePassword(BaseModel):
 class UpdatePhoneNumberRequest(BaseModel):
     phone_number: str
 
-db_dependency = Annotated[Session, Depends(get_db)]
+db_dependency = Annotated[AsyncSession, Depends(get_db)]
+read_db_dependency = Annotated[AsyncSession, Depends(get_read_db)]
 user_dependency = Annotated[dict, Depends(get_current_user)]
 
-@router.get("/me/", status_code=status.HTTP_200_OK)
-async def get_my_information(user: user_dependency, db:db_dependency):
+@router.get("/me/", status_code=status.HTTP_200_OK, response_model=UserResponse)
+async def get_my_information(user: user_dependency, db:read_db_dependency,
+                             if_none_match: Optional[str] = Header(default=None)):
     if user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized")
-    current_user = db.query(models.Users).filter(models.Users.id == user.get("id")).first()
+    headers = {"Cache-Control": "private, no-cache"}
+    # Same per-user watermark as the todo routes; the writes below move it forward.
+    if todo_cache.shared:
+        headers["ETag"] = make_etag(user.get("id"), await todo_cache.generation(user.get("id")), "me")
+        if etag_matches(if_none_match, headers["ETag"]):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    current_user = await db.scalar(select(models.Users).filter(models.Users.id == user.get("id")))
     if current_user is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
-    return current_user
+    return json_response(UserResponse, current_user, headers)
     
 @router.put("/change_password/", status_code=status.HTTP_204_NO_CONTENT)
 async def change_password(user:user_dependency, db:db_dependency, password_change: ChangePassword):
     if user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized")
-    current_user = db.query(models.Users).filter(models.Users.id == user.get("id")).first()
+    current_user = await db.scalar(select(models.Users).filter(models.Users.id == user.get("id")))
     if current_user is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
-    if not bcrypt_context.verify(password_change.old_password, current_user.hashed_password):
+    if not await verify_password(password_change.old_password, current_user.hashed_password):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized")
-    current_user.hashed_password = bcrypt_context.hash(password_change.new_password)
+    current_user.hashed_password = await hash_password(password_change.new_password)
     db.add(current_user)
-    db.commit()
+    await db.commit()
+    await todo_cache.invalidate(user.get("id"))
     
     
 @router.put("/update_phone_number", status_code = status.HTTP_204_NO_CONTENT)
 async def update_phone_number(user:user_dependency, db: db_dependency, phone_number:UpdatePhoneNumberRequest):
-    current_user = db.query(models.Users).filter(models.Users.id == user.get("id")).first()
+    current_user = await db.scalar(select(models.Users).filter(models.Users.id == user.get("id")))
     if current_user is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
     if current_user.phone_number == phone_number.phone_number:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Phone number already exists")
     current_user.phone_number = phone_number.phone_number
     db.add(current_user)
-    db.commit()
\ No newline at end of file
+    await db.commit()
+    await todo_cache.invalidate(user.get("id"))
\ No newline at end of file
@@ -0,0 +1,59 @@
+from datetime import datetime
+from functools import lru_cache
+from typing import Optional
+from fastapi import Response
+from pydantic import BaseModel, ConfigDict, TypeAdapter
+from request_timing import timed
+
+
+class TodoResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    title: Optional[str]
+    description: Optional[str]
+    priority: Optional[int]
+    complete: Optional[bool]
+    owner_id: Optional[int]
+    updated_at: Optional[datetime] = None
+
+
+class TodoPage(BaseModel):
+    todos: list[TodoResponse]
+    next_cursor: Optional[str]
+
+
+class TodoChanges(BaseModel):
+    changed: list[TodoResponse]
+    deleted: list[int]
+    sync_token: str
+
+
+class UserResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    email: Optional[str]
+    user_name: Optional[str]
+    first_name: Optional[str]
+    last_name: Optional[str]
+    is_active: Optional[bool]
+    role: Optional[str]
+    phone_number: Optional[str]
+
+
+@lru_cache
+def adapter(schema) -> TypeAdapter:
+    return TypeAdapter(schema)
+
+
+def json_response(schema, value, headers: Optional[dict] = None) -> Response:
+    """Serialize a route's result with its response schema, timed as the "serialize" phase.
+
+    FastAPI would otherwise serialize response_model routes after the handler
+    returns, outside of what Server-Timing can attribute.
+    """
+    with timed("serialize"):
+        schema_adapter = adapter(schema)
+        content = schema_adapter.dump_json(schema_adapter.validate_python(value, from_attributes=True))
+    return Response(content=content, media_type="application/json", headers=headers)
@@ -0,0 +1,64 @@
+import asyncio
+import os
+import sys
+import tempfile
+
+import pytest
+
+# The app imports its modules top-level (run from todo_app/) and reads its settings at import time.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("TODO_DATABASE_URL", f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/test.db")
+
+import models
+from database import LocalSession, engine
+from routers.auth import create_access_token
+
+
+@pytest.fixture(scope="session")
+def run():
+    """Runs a coroutine on one event loop shared by the whole session, like the engine's pool."""
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(create_tables())
+    yield loop.run_until_complete
+    loop.run_until_complete(engine.dispose())
+    loop.close()
+
+
+async def create_tables():
+    async with engine.begin() as conn:
+        await conn.run_sync(models.Base.metadata.create_all)
+
+
+@pytest.fixture
+def owner(run):
+    """A user with three todos, as the dict get_current_user returns."""
+    async def create():
+        async with LocalSession() as db:
+            user = models.Users(email=None, user_name=f"user{os.urandom(4).hex()}", first_name="f", last_name="l",
+                                hashed_password="x", role="admin", is_active=True, phone_number="1")
+            db.add(user)
+            await db.flush()
+            db.add_all([models.Todos(title=f"todo {i}", description="description", priority=i + 1,
+                                     complete=False, owner_id=user.id) for i in range(3)])
+            await db.commit()
+            return {"username": user.user_name, "id": user.id, "role": user.role}
+    return run(create())
+
+
+@pytest.fixture(scope="session")
+def client(run):
+    from fastapi.testclient import TestClient
+    from main import app
+
+    # TestClient runs the app on its own event loop; pooled connections can't move between loops.
+    run(engine.dispose())
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture
+def headers(owner):
+    from datetime import timedelta
+
+    token = create_access_token(owner["username"], owner["id"], owner["role"], timedelta(minutes=5))
+    return {"Authorization": f"Bearer {token}"}
@@ -0,0 +1,40 @@
+import pytest
+
+from cache import ClientBackend, LocalKeyValueClient, MemoryBackend, TodoCache
+from routers import todos, user
+
+
+def process_local_caches(workers):
+    # One cache per worker process, each with a backend of its own.
+    return [TodoCache(ClientBackend(LocalKeyValueClient()), 60, workers) for _ in range(2)]
+
+
+@pytest.mark.parametrize("workers", [None, 2])
+def test_process_local_backend_is_bypassed_unless_single_worker_is_stated(run, workers):
+    first, second = process_local_caches(workers)
+    assert not first.shared and not second.shared
+    run(first.set(1, "generation", "list", b"[]"))
+    assert run(first.get(1, "generation", "list")) is None
+
+
+def test_stated_single_worker_uses_the_process_local_backend(run):
+    cache = TodoCache(MemoryBackend(1024 * 1024), 60, workers=1)
+    assert cache.shared
+    run(cache.set(1, "generation", "list", b"[]"))
+    assert run(cache.get(1, "generation", "list")) == b"[]"
+
+
+def test_no_etag_with_a_process_local_backend_and_several_workers(run, client, owner, headers, monkeypatch):
+    first, second = process_local_caches(2)
+    # A write handled by the first worker doesn't move the second one's watermark.
+    before = run(second.generation(owner["id"]))
+    run(first.invalidate(owner["id"]))
+    assert run(second.generation(owner["id"])) == before
+
+    monkeypatch.setattr(todos, "todo_cache", second)
+    monkeypatch.setattr(user, "todo_cache", second)
+    todo_id = client.get("/", headers=headers).json()["todos"][0]["id"]
+    for path in ["/", f"/todo-by-id/{todo_id}", "/users/me/"]:
+        response = client.get(path, headers={**headers, "If-None-Match": "*"})
+        assert response.status_code == 200
+        assert "etag" not in response.headers
@@ -0,0 +1,83 @@
+import asyncio
+
+import hashing
+from hashing import DEFAULT_PRIORITY, LOGIN_PRIORITY, SIGNUP_PRIORITY, PasswordPool
+
+
+def queue(pool, order, priority, name):
+    """A task that waits for a slot, records that it got one and gives it back."""
+    async def take_slot():
+        await pool._acquire(priority)
+        order.append(name)
+        pool._release()
+    return asyncio.ensure_future(take_slot())
+
+
+def test_login_is_served_before_an_earlier_signup(run):
+    pool = PasswordPool(1)
+    order = []
+
+    async def scenario():
+        await pool._acquire(DEFAULT_PRIORITY)
+        signup = queue(pool, order, SIGNUP_PRIORITY, "signup")
+        await asyncio.sleep(0)
+        login = queue(pool, order, LOGIN_PRIORITY, "login")
+        await asyncio.sleep(0)
+        assert pool.queue_depth == 2
+        pool._release()
+        await asyncio.wait_for(asyncio.gather(signup, login), 1)
+    run(scenario())
+
+    assert order == ["login", "signup"]
+    assert pool.running == 0 and pool.max_queue_depth == 2
+
+
+def test_cancelled_waiter_is_skipped(run):
+    pool = PasswordPool(1)
+    order = []
+
+    async def scenario():
+        await pool._acquire(DEFAULT_PRIORITY)
+        login = queue(pool, order, LOGIN_PRIORITY, "login")
+        signup = queue(pool, order, SIGNUP_PRIORITY, "signup")
+        await asyncio.sleep(0)
+        login.cancel()
+        await asyncio.sleep(0)
+        assert pool.queue_depth == 1
+        pool._release()
+        await asyncio.wait_for(signup, 1)
+    run(scenario())
+
+    assert order == ["signup"]
+    assert pool.running == 0
+
+
+def test_waiter_cancelled_after_being_handed_the_slot_passes_it_on(run):
+    pool = PasswordPool(1)
+    order = []
+
+    async def scenario():
+        await pool._acquire(DEFAULT_PRIORITY)
+        login = queue(pool, order, LOGIN_PRIORITY, "login")
+        signup = queue(pool, order, SIGNUP_PRIORITY, "signup")
+        await asyncio.sleep(0)
+        # The login's waiter gets the slot, but the task is cancelled before it resumes.
+        pool._release()
+        login.cancel()
+        await asyncio.wait_for(asyncio.gather(login, signup, return_exceptions=True), 1)
+        assert login.cancelled()
+    run(scenario())
+
+    assert order == ["signup"]
+    assert pool.running == 0
+
+
+def test_workers_are_not_forked_from_the_server(run):
+    pool = PasswordPool(1)
+    try:
+        executor = pool.start()
+        assert executor._mp_context.get_start_method() == hashing.PASSWORD_START_METHOD != "fork"
+        hashed = run(pool.run(LOGIN_PRIORITY, hashing._hash, "password"))
+        assert run(pool.run(LOGIN_PRIORITY, hashing._verify, "password", hashed))
+    finally:
+        pool.shutdown()
@@ -0,0 +1,47 @@
+from sqlalchemy import select
+
+import models
+from database import engine
+
+
+def query_plan(run, statement) -> str:
+    """SQLite's EXPLAIN QUERY PLAN for a statement, one line per step."""
+    sql = str(statement.compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True}))
+
+    async def explain():
+        async with engine.connect() as conn:
+            return (await conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}")).all()
+    return "\n".join(row[-1] for row in run(explain()))
+
+
+def owner_todos(owner_id=1):
+    return select(models.Todos).filter(models.Todos.owner_id == owner_id)
+
+
+# On SQLite id is the rowid, which every index entry ends with, so ix_todos_owner_id
+# serves (owner_id, id) as well as ix_todos_owner_id_id does; either one is fine here.
+
+def test_owner_list_uses_owner_id_index(run, owner):
+    plan = query_plan(run, owner_todos().order_by(models.Todos.id).limit(51))
+    assert "SEARCH todos USING INDEX ix_todos_owner_id" in plan
+    # Already in id order, so no sort step.
+    assert "TEMP B-TREE" not in plan
+
+
+def test_owner_list_page_seeks_to_the_cursor(run, owner):
+    plan = query_plan(run, owner_todos().filter(models.Todos.id > 100).order_by(models.Todos.id).limit(51))
+    assert "SEARCH todos USING INDEX ix_todos_owner_id" in plan
+    assert "(owner_id=? AND rowid>?)" in plan or "(owner_id=? AND id>?)" in plan
+    assert "TEMP B-TREE" not in plan
+
+
+def test_todo_by_id_is_a_key_lookup(run, owner):
+    plan = query_plan(run, owner_todos().filter(models.Todos.id == 7))
+    assert plan.startswith("SEARCH todos")
+    assert "SCAN" not in plan
+
+
+def test_complete_and_priority_filter_uses_composite_index(run, owner):
+    plan = query_plan(run, owner_todos().filter(models.Todos.complete == False)
+                      .filter(models.Todos.priority == 3).order_by(models.Todos.id).limit(51))
+    assert "USING INDEX ix_todos_owner_id_complete_priority (owner_id=? AND complete=? AND priority=?)" in plan
@@ -0,0 +1,20 @@
+from metrics import Histogram, registry
+
+
+def test_histogram_renders_prometheus_bucket_bounds():
+    histogram = Histogram("test_seconds", "Test histogram.", ("route",), buckets=(0.5, 1.0))
+    registry.remove(histogram)
+    histogram.observe(0.2, "/")
+    histogram.observe(3.0, "/")
+    lines = histogram.render().splitlines()
+    assert 'test_seconds_bucket{route="/",le="0.5"} 1' in lines
+    assert 'test_seconds_bucket{route="/",le="1.0"} 1' in lines
+    assert 'test_seconds_bucket{route="/",le="+Inf"} 2' in lines
+    assert 'test_seconds_count{route="/"} 2' in lines
+
+
+def test_metrics_endpoint_has_no_inf_bounds(client, headers):
+    client.get("/", headers=headers)
+    body = client.get("/metrics").text
+    assert 'le="+Inf"' in body
+    assert 'le="inf"' not in body
@@ -0,0 +1,53 @@
+import asyncio
+import time
+
+from sqlalchemy import event, text
+
+from database import create_engine_for, pool_wait_stats
+
+
+def test_opening_a_connection_is_not_counted_as_waiting(run, tmp_path):
+    pool_engine = create_engine_for(f"sqlite+aiosqlite:///{tmp_path}/pool.db")
+
+    @event.listens_for(pool_engine.sync_engine, "connect")
+    def slow_connect(dbapi_connection, connection_record):
+        time.sleep(0.2)
+
+    async def checkout_twice():
+        try:
+            for _ in range(2):
+                async with pool_engine.connect() as conn:
+                    await conn.execute(text("SELECT 1"))
+        finally:
+            await pool_engine.dispose()
+
+    before = pool_wait_stats.wait_seconds_total
+    run(checkout_twice())
+    # The first checkout opened a connection for 0.2 s, the second reused it; neither waited.
+    assert pool_wait_stats.wait_seconds_total - before < 0.1
+
+
+def test_waiting_for_a_busy_pool_is_counted(run, tmp_path, monkeypatch):
+    monkeypatch.setenv("TODO_DB_POOL_SIZE", "1")
+    monkeypatch.setenv("TODO_DB_MAX_OVERFLOW", "0")
+    pool_engine = create_engine_for(f"sqlite+aiosqlite:///{tmp_path}/pool.db")
+
+    async def hold(seconds):
+        async with pool_engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+            await asyncio.sleep(seconds)
+
+    async def contend():
+        try:
+            await hold(0)
+            await asyncio.gather(hold(0.2), hold(0))
+        finally:
+            await pool_engine.dispose()
+
+    before = pool_wait_stats.wait_seconds_max
+    pool_wait_stats.wait_seconds_max = 0.0
+    try:
+        run(contend())
+        assert pool_wait_stats.wait_seconds_max >= 0.15
+    finally:
+        pool_wait_stats.wait_seconds_max = max(before, pool_wait_stats.wait_seconds_max)
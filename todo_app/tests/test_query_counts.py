@@ -0,0 +1,72 @@
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import select
+
+import models
+from database import LocalSession
+from request_timing import track_statements
+from routers import admin, todos
+
+
+def owned_todo_ids(run, owner_id):
+    async def query():
+        async with LocalSession() as db:
+            return (await db.scalars(select(models.Todos.id).filter(models.Todos.owner_id == owner_id)
+                                     .order_by(models.Todos.id))).all()
+    return run(query())
+
+
+def call(run, handler, owner, *args):
+    """Call a write route with a session opened the way its dependency opens it."""
+    async def handle():
+        async with LocalSession(info={"user_id": owner["id"]}) as db:
+            await handler(owner, db, *args)
+    run(handle())
+
+
+def statements_of(run, handler, owner, *args):
+    with track_statements() as timings:
+        call(run, handler, owner, *args)
+    return list(timings.statement_counts.elements())
+
+
+def kinds(statements):
+    return [" ".join(statement.split()[:3]) for statement in statements]
+
+
+def test_update_todo_is_one_update_after_the_sync_version(run, owner):
+    todo_id = owned_todo_ids(run, owner["id"])[0]
+    request = todos.TodoRequest(title="changed", description="description", priority=5, complete=True)
+    statements = statements_of(run, todos.update_todo, owner, request, todo_id)
+    # The sync version bump (one UPDATE ... RETURNING on SQLite), then the todo itself.
+    assert kinds(statements) == ["UPDATE users SET", "UPDATE todos SET"]
+
+    async def title():
+        async with LocalSession() as db:
+            return await db.scalar(select(models.Todos.title).filter(models.Todos.id == todo_id))
+    assert run(title()) == "changed"
+
+
+def test_update_of_someone_elses_todo_is_404_after_two_statements(run, owner):
+    todo_id = owned_todo_ids(run, owner["id"])[0]
+    request = todos.TodoRequest(title="changed", description="description", priority=5, complete=True)
+    with track_statements() as timings, pytest.raises(HTTPException) as error:
+        call(run, todos.update_todo, {**owner, "id": owner["id"] + 1000}, request, todo_id)
+    assert error.value.status_code == 404
+    assert timings.statements == 2
+
+
+def test_delete_todo_is_one_delete_and_its_tombstone(run, owner):
+    todo_id = owned_todo_ids(run, owner["id"])[0]
+    statements = statements_of(run, todos.delete_todo, owner, todo_id)
+    # The DELETE, plus the tombstone /todo/changes reports deletions from; no SELECT first.
+    assert kinds(statements) == ["UPDATE users SET", "DELETE FROM todos", "INSERT INTO todo_tombstones"]
+    assert todo_id not in owned_todo_ids(run, owner["id"])
+
+
+def test_admin_delete_todo_is_one_delete_and_its_tombstone(run, owner):
+    todo_id = owned_todo_ids(run, owner["id"])[0]
+    statements = statements_of(run, admin.delete_todo, owner, todo_id)
+    # The owner is looked up first so their sync version is locked before the todo.
+    assert [statement.split()[0] for statement in statements] == ["SELECT", "UPDATE", "DELETE", "INSERT"]
+    assert todo_id not in owned_todo_ids(run, owner["id"])
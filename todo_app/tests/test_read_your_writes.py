@@ -0,0 +1,66 @@
+import itertools
+import os
+import sqlite3
+import tempfile
+import time
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+import database
+import models
+from database import LocalSession, create_engine_for, read_session
+
+
+@pytest.fixture
+def lagging_replica(run, owner, monkeypatch):
+    """A replica file copied from the primary now, which never sees a later write."""
+    replica_path = os.path.join(tempfile.mkdtemp(), "replica.db")
+    with sqlite3.connect(make_url(os.environ["TODO_DATABASE_URL"]).database) as primary, \
+            sqlite3.connect(replica_path) as replica:
+        primary.backup(replica)
+    replica_engine = create_engine_for(f"sqlite+aiosqlite:///{replica_path}", read_only=True)
+    monkeypatch.setattr(database, "read_sessionmakers", itertools.cycle([
+        async_sessionmaker(bind=replica_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+    ]))
+    yield replica_engine
+    run(replica_engine.dispose())
+
+
+def write_todo(run, owner, title):
+    async def write():
+        # As the write routes open their session (routers.todos.get_db).
+        async with LocalSession(info={"user_id": owner["id"]}) as db:
+            db.add(models.Todos(title=title, description="description", priority=1, complete=False,
+                                owner_id=owner["id"], version=1))
+            await db.commit()
+    run(write())
+
+
+def visible_titles(run, user_id):
+    async def read():
+        async with read_session(user_id) as db:
+            return set(await db.scalars(select(models.Todos.title)))
+    return run(read())
+
+
+def test_writer_reads_the_primary_inside_the_window(run, owner, lagging_replica, monkeypatch):
+    monkeypatch.setattr(database, "READ_YOUR_WRITES_SECONDS", 60)
+    write_todo(run, owner, "written just now")
+
+    assert "written just now" in visible_titles(run, owner["id"])
+    # Everyone else still reads the lagging replica.
+    assert "written just now" not in visible_titles(run, None)
+    assert "todo 0" in visible_titles(run, None)
+
+
+def test_writer_goes_back_to_the_replica_after_the_window(run, owner, lagging_replica, monkeypatch):
+    monkeypatch.setattr(database, "READ_YOUR_WRITES_SECONDS", 0.2)
+    write_todo(run, owner, "written a while ago")
+    assert "written a while ago" in visible_titles(run, owner["id"])
+
+    time.sleep(0.3)
+    assert not database.wrote_recently(owner["id"])
+    assert "written a while ago" not in visible_titles(run, owner["id"])
@@ -0,0 +1,67 @@
+import os
+import re
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from database import create_engine_for
+from request_timing import track_statements
+
+
+def assert_query_count(response, expected: int):
+    """Fail unless a response's Server-Timing header reports exactly `expected` statements.
+
+    An exact count, so a response served without touching the database (a
+    cache hit, or statements the listeners missed) fails too.
+    """
+    match = re.search(r'db;dur=[\d.]+;desc="(\d+) queries"', response.headers.get("server-timing", ""))
+    assert match is not None, "response has no Server-Timing db metric"
+    statements = int(match.group(1))
+    assert statements == expected, f"{statements} SQL statements, expected {expected}"
+
+
+def server_timing_phases(response) -> set:
+    return {metric.split(";")[0].strip() for metric in response.headers["server-timing"].split(",")}
+
+
+def test_todo_by_id_is_one_query(client, headers):
+    todos = client.get("/", headers=headers).json()["todos"]
+    response = client.get(f"/todo-by-id/{todos[0]['id']}", headers={**headers, "Cache-Control": "no-cache"})
+    assert response.status_code == 200
+    assert_query_count(response, 1)
+
+
+def test_todo_list_is_one_query(client, headers):
+    response = client.get("/", params={"complete": False, "priority": 2}, headers=headers)
+    assert response.status_code == 200
+    assert_query_count(response, 1)
+
+
+@pytest.mark.parametrize("path", ["/todo/changes", "/users/me/", "/admin/todo"])
+def test_response_model_routes_report_serialize_time(client, headers, path):
+    response = client.get(path, headers=headers)
+    assert response.status_code == 200
+    assert "serialize" in server_timing_phases(response)
+
+
+def test_failed_statement_leaves_nothing_on_the_connection(run):
+    # A separate engine, so the test owns its pool and its one connection.
+    statement_engine = create_engine_for(os.environ["TODO_DATABASE_URL"])
+
+    async def fail_then_succeed():
+        try:
+            async with statement_engine.connect() as conn:
+                before = dict(conn.info)
+                with pytest.raises(OperationalError):
+                    await conn.execute(text("SELECT * FROM no_such_table"))
+                assert conn.info == before
+                with track_statements() as timings:
+                    await conn.execute(text("SELECT 1"))
+                return timings
+        finally:
+            await statement_engine.dispose()
+
+    timings = run(fail_then_succeed())
+    assert timings.statements == 1
+    assert 0 <= timings.phases["db"] < 1
@@ -0,0 +1,63 @@
+from sqlalchemy import insert
+
+import models
+from database import LocalSession
+from routers.todos import next_sync_version
+
+TODO = {"title": "todo title", "description": "description", "priority": 3, "complete": False}
+
+
+def changes(client, headers, token=None):
+    params = {} if token is None else {"since": token}
+    response = client.get("/todo/changes", params=params, headers=headers)
+    assert response.status_code == 200
+    body = response.json()
+    return [todo["id"] for todo in body["changed"]], body["deleted"], body["sync_token"]
+
+
+def test_idle_polls_return_nothing(client, headers):
+    _, _, token = changes(client, headers)
+    assert client.post("/todo/batch", json=[TODO] * 7, headers=headers).status_code == 201
+    ids, _, _ = changes(client, headers)
+    assert client.put(f"/todo/update/{ids[0]}", json={**TODO, "title": "changed"}, headers=headers).status_code == 204
+    assert client.delete(f"/todo/{ids[1]}", headers=headers).status_code == 204
+
+    changed, deleted, token = changes(client, headers, token)
+    assert ids[0] in changed and ids[1] not in changed
+    assert deleted == [ids[1]]
+    for _ in range(2):
+        assert changes(client, headers, token) == ([], [], token)
+
+
+def test_deleted_ids_are_not_reused(client, headers):
+    ids, _, token = changes(client, headers)
+    assert client.delete(f"/todo/{ids[-1]}", headers=headers).status_code == 204
+    assert client.post("/todo", json=TODO, headers=headers).status_code == 201
+
+    changed, deleted, _ = changes(client, headers, token)
+    assert deleted == [ids[-1]]
+    assert len(changed) == 1 and changed[0] > ids[-1]
+
+
+def test_tombstone_older_than_a_reused_id_is_dropped(run, client, owner, headers):
+    ids, _, token = changes(client, headers)
+    assert client.delete(f"/todo/{ids[0]}", headers=headers).status_code == 204
+
+    async def reuse_id():
+        # What MySQL before 8.0 can do after a restart.
+        async with LocalSession() as db:
+            version = await next_sync_version(db, owner["id"])
+            await db.execute(insert(models.Todos.__table__),
+                             [{**TODO, "id": ids[0], "owner_id": owner["id"], "version": version}])
+            await db.commit()
+    run(reuse_id())
+
+    changed, deleted, _ = changes(client, headers, token)
+    assert changed == [ids[0]]
+    assert deleted == []
+
+
+def test_invalid_sync_tokens_are_rejected(client, headers):
+    for token in ["not base64!", "MjAyNi0xMC0xOFQxMDowMDowMCswMjowMA==", "LTE="]:
+        response = client.get("/todo/changes", params={"since": token}, headers=headers)
+        assert response.status_code == 400
@@ -0,0 +1,21 @@
+import pytest
+from starlette.websockets import WebSocketDisconnect
+
+
+@pytest.mark.parametrize("first_frame", [b'{"token": "x"}', "not json", "[]", '{"token": "invalid"}'])
+def test_bad_auth_frame_closes_with_policy_violation(client, first_frame):
+    with client.websocket_connect("/todo/ws") as websocket:
+        if isinstance(first_frame, bytes):
+            websocket.send_bytes(first_frame)
+        else:
+            websocket.send_text(first_frame)
+        with pytest.raises(WebSocketDisconnect) as closed:
+            websocket.receive_json()
+    assert closed.value.code == 1008
+
+
+def test_authenticated_socket_acknowledges_commands(client, owner, headers):
+    token = headers["Authorization"].removeprefix("Bearer ")
+    with client.websocket_connect("/todo/ws") as websocket:
+        websocket.send_json({"token": token})
+        assert websocket.receive_json() == {"ok": True, "user_id": owner["id"]}
@@ -0,0 +1,60 @@
+import asyncio
+
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+
+import models
+from database import LocalSession
+from write_coalescer import InsertCoalescer
+
+
+def todo_row(owner, title, **columns):
+    return {"title": title, "description": "description", "priority": 1, "complete": False,
+            "owner_id": owner["id"], "version": 1, **columns}
+
+
+def titles(run, owner):
+    async def query():
+        async with LocalSession() as db:
+            return set(await db.scalars(select(models.Todos.title).filter(models.Todos.owner_id == owner["id"])))
+    return run(query())
+
+
+def test_a_failed_batch_is_retried_row_by_row(run, owner):
+    # Three rows fill the batch, so it flushes without waiting for the window.
+    coalescer = InsertCoalescer(models.Todos.__table__, LocalSession, window=60, max_batch=3)
+    rows = [todo_row(owner, "first"), todo_row(owner, "broken", version=None), todo_row(owner, "third")]
+
+    async def insert_all():
+        return await asyncio.gather(*(coalescer.insert(row) for row in rows), return_exceptions=True)
+    results = run(insert_all())
+
+    assert results[0] is None and results[2] is None
+    assert isinstance(results[1], IntegrityError)
+    assert {"first", "third"} <= titles(run, owner)
+    assert "broken" not in titles(run, owner)
+    assert coalescer.stats()["batches"] == 1
+
+
+def test_close_flushes_pending_rows(run, owner):
+    coalescer = InsertCoalescer(models.Todos.__table__, LocalSession, window=60, max_batch=100)
+
+    async def insert_then_close():
+        pending = asyncio.ensure_future(coalescer.insert(todo_row(owner, "pending at shutdown")))
+        await asyncio.sleep(0)
+        assert coalescer.stats()["pending"] == 1
+        await coalescer.close()
+        await asyncio.wait_for(pending, 1)
+    run(insert_then_close())
+
+    assert "pending at shutdown" in titles(run, owner)
+    assert coalescer.stats()["pending"] == 0
+
+
+def test_prepare_can_fill_in_columns(run, owner):
+    async def stamp(db, rows):
+        for row in rows:
+            row["title"] = row["title"].upper()
+    coalescer = InsertCoalescer(models.Todos.__table__, LocalSession, window=0, max_batch=100, prepare=stamp)
+    run(coalescer.insert(todo_row(owner, "prepared")))
+    assert "PREPARED" in titles(run, owner)
@@ -0,0 +1,64 @@
+import hashlib
+import os
+import time
+from collections import OrderedDict
+
+from metrics import CallbackMetric
+
+TOKEN_CACHE_SIZE = int(os.getenv("TODO_TOKEN_CACHE_SIZE", 10000))
+
+
+class TokenCache:
+    """Bounded LRU of already-verified bearer tokens.
+
+    Entries are keyed by a SHA-256 digest of the token, so raw tokens are never
+    kept in memory, and each entry is dropped once the token's `exp` is reached.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def get(self, token: str):
+        key = self._key(token)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires, user = entry
+        if time.time() >= expires:
+            del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return dict(user)
+
+    def set(self, token: str, user: dict, expires):
+        if self.maxsize <= 0 or expires is None or time.time() >= expires:
+            return
+        self._entries[self._key(token)] = (expires, dict(user))
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+
+token_cache = TokenCache(TOKEN_CACHE_SIZE)
+CallbackMetric("todo_token_cache_lookups_total", "Token cache lookups by result.", "counter",
+               lambda: {(("result", "hit"),): token_cache.hits, (("result", "miss"),): token_cache.misses})
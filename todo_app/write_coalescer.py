@@ -0,0 +1,103 @@
+import asyncio
+import os
+
+from sqlalchemy import insert
+
+COALESCE_WRITES = os.getenv("TODO_COALESCE_WRITES", "false").lower() in ("1", "true", "yes")
+COALESCE_WINDOW_MS = float(os.getenv("TODO_COALESCE_WINDOW_MS", 5))
+COALESCE_MAX_BATCH = int(os.getenv("TODO_COALESCE_MAX_BATCH", 500))
+
+
+class InsertCoalescer:
+    """Group-commits single-row inserts into one multi-row INSERT.
+
+    Rows submitted within `window` seconds of each other (or until
+    `max_batch` rows are waiting) are written with one executemany and one
+    commit. If that batch fails, its rows are retried one at a time so that
+    each caller gets back its own row's outcome.
+
+    `prepare`, if given, is awaited with the session and the rows before each
+    INSERT, in the same transaction, and may fill in columns.
+    """
+
+    def __init__(self, table, session_factory, window: float, max_batch: int, prepare=None):
+        self.table = table
+        self.session_factory = session_factory
+        self.prepare = prepare
+        self.window = window
+        self.max_batch = max_batch
+        self.batches = 0
+        self.rows = 0
+        self._pending = []
+        self._timer = None
+        self._flushes = set()
+
+    async def insert(self, row: dict):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((row, future))
+        if len(self._pending) >= self.max_batch:
+            self._start_flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._start_flush)
+        # Shielded so a cancelled request doesn't cancel its row mid-batch.
+        await asyncio.shield(future)
+
+    async def close(self):
+        self._start_flush()
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "rows": self.rows,
+            "pending": len(self._pending),
+            "average_batch_size": self.rows / self.batches if self.batches else 0.0,
+        }
+
+    def _start_flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            flush = asyncio.create_task(self._flush(batch))
+            self._flushes.add(flush)
+            flush.add_done_callback(self._flushes.discard)
+
+    async def _flush(self, batch):
+        self.batches += 1
+        self.rows += len(batch)
+        try:
+            await self._insert([row for row, _ in batch])
+        except Exception as error:
+            if len(batch) == 1:
+                self._finish(batch[0][1], error)
+                return
+            for row, future in batch:
+                try:
+                    await self._insert([row])
+                except Exception as error:
+                    self._finish(future, error)
+                else:
+                    self._finish(future)
+            return
+        for _, future in batch:
+            self._finish(future)
+
+    async def _insert(self, rows: list):
+        async with self.session_factory() as db:
+            if self.prepare is not None:
+                await self.prepare(db, rows)
+            await db.execute(insert(self.table), rows)
+            await db.commit()
+
+    @staticmethod
+    def _finish(future, error=None):
+        if future.done():
+            return
+        if error is None:
+            future.set_result(None)
+        else:
+            future.set_exception(error)